@@ -1,25 +1,160 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
 import json
 import datetime
 import time
+import threading
+from collections import deque
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from tqdm import tqdm
 
+
+class _AdaptiveConcurrency:
+    """
+    Additive-increase/multiplicative-decrease limit on the chunks uploaded at once.
+    Every fast response allows one more request in flight, up to `maximum`. A 429,
+    a 5xx, an error or a response `latency_factor` times slower than the fastest
+    one halves the limit, at most once per round of requests in flight. A
+    Retry-After pauses new requests until it has passed.
+    """
+    def __init__(self, maximum, latency_factor=4):
+        self.maximum = maximum
+        self.latency_factor = latency_factor
+        self.limit = 1
+        self.fastest = None
+        self.paused_until = 0.0
+        self._decreased_at = 0.0
+
+    def _decrease(self, started):
+        # Requests already in flight at the last decrease don't count again
+        if started >= self._decreased_at:
+            self.limit = max(1, self.limit // 2)
+            self._decreased_at = time.monotonic()
+
+    def succeeded(self, started, latency):
+        self.fastest = latency if self.fastest is None else min(self.fastest, latency)
+        if latency > self.fastest * self.latency_factor:
+            self._decrease(started)
+        else:
+            self.limit = min(self.maximum, self.limit + 1)
+
+    def failed(self, started, delay):
+        self._decrease(started)
+        self.paused_until = max(self.paused_until, time.monotonic() + delay)
+
+    def pause_remaining(self):
+        return max(0.0, self.paused_until - time.monotonic())
+
+
 class API:
-    def __init__(self, token):
+    """
+    Client for the SmallShovel data API. All requests go through one keep-alive
+    session with a pool of up to `pool_size` connections, so chunked uploads reuse
+    connections instead of doing a TCP and TLS handshake per request. Requests time
+    out after `connect_timeout`/`read_timeout` seconds. Call `close()`, or use the
+    API as a context manager, to release the connections.
+
+    Large tables are uploaded in chunks by up to `pool_size` concurrent requests
+    (see _AdaptiveConcurrency). Chunks answered with a 429, or whose connection
+    could not be opened, are retried `max_retries` times. The extend endpoint appends,
+    so a chunk that may have reached the server (a 5xx, a read timeout, a dropped
+    connection) is only retried with `retry_unsafe=True`, at the risk of duplicate
+    rows, and otherwise counted as failed. Chunks may reach the server out of order.
+    """
+    def __init__(self, token, base_url="https://small-shovel-demo-demo.onrender.com", pool_size=10, connect_timeout=10, read_timeout=300, max_retries=3, retry_unsafe=False):
         self.token = token
-        self.base_url = "https://small-shovel-demo-demo.onrender.com"
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.retry_unsafe = retry_unsafe
+        self.session = None
+        self.request_count = 0
+        self.latencies = deque(maxlen=1000)
+        self._lock = threading.Lock()
 
-    def send_data(self, key_path, table, transmit_data):
+    def _session(self):
+        with self._lock:
+            if self.session is None:
+                self.session = requests.Session()
+                self.session.headers.update({'Authorization': self.token})
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                self.session.mount("http://", adapter)
+                self.session.mount("https://", adapter)
+            return self.session
+
+    def _post(self, path, data):
+        session = self._session()
+        start = time.perf_counter()
+        resp = session.post(self.base_url + path, data=data, timeout=self.timeout)
+        latency = time.perf_counter() - start
+        with self._lock:
+            self.request_count += 1
+            self.latencies.append(latency)
+        return resp
 
-        session = requests.session()
-        session.headers.update({'Authorization': self.token})
+    def connections(self):
+        '''
+        Returns how many connections, and so handshakes, the session has opened.
+        '''
+        if self.session is None:
+            return 0
+        adapter = self.session.get_adapter(self.base_url)
+        pools = adapter.poolmanager.pools
+        return sum(pools[key].num_connections for key in pools.keys())
+
+    def stats(self):
+        '''
+        Returns the number of requests and connections so far and the latency of the
+        recent requests in seconds.
+        '''
+        with self._lock:
+            latencies = sorted(self.latencies)
+            requests_sent = self.request_count
+        return {
+            "requests": requests_sent,
+            "connections": self.connections(),
+            "mean_latency": sum(latencies) / len(latencies) if latencies else None,
+            "median_latency": latencies[len(latencies) // 2] if latencies else None,
+            "max_latency": latencies[-1] if latencies else None,
+        }
+
+    def close(self):
+        with self._lock:
+            if self.session is not None:
+                self.session.close()
+                self.session = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @staticmethod
+    def _body(fields, transmit_data):
+        '''
+        Returns the JSON request body for `fields` plus `transmit_data` as "value", as
+        bytes. DataFrames are written straight into the body with `to_json`, without
+        building Python dicts for their rows.
+        '''
+        if not hasattr(transmit_data, "to_json"):
+            return json.dumps({**fields, "value": transmit_data}).encode("utf-8")
+
+        # Splice the rows in where the placeholder null ends the object
+        head = json.dumps({**fields, "value": None})[:-len("null}")]
+        rows = transmit_data.to_json(orient='records', default_handler=str)
+        return b"".join((head.encode("utf-8"), rows.encode("utf-8"), b"}"))
+
+    def send_data(self, key_path, table, transmit_data):
 
         data = {
             "key_path": key_path,
             "new_key": table,
-            "value": transmit_data
         }
-        resp = session.post(self.base_url+"/api/client-data/add", data=json.dumps(data))
+        resp = self._post("/api/client-data/add", self._body(data, transmit_data))
         if resp.status_code == 200:
             current_time = datetime.datetime.now()
             print(f"{current_time} - {table}: {resp.json()}")
@@ -33,16 +168,15 @@ class API:
         print("Splitting list")
         return [input_list[i:i + chunk_size] for i in range(0, len(input_list), chunk_size)]
         
-    def extend_data(self, key_path, table, transmit_data):
-
-        session = requests.session()
-        session.headers.update({'Authorization': self.token})
-
+    def _extend_request(self, key_path, table, transmit_data):
         data = {
             "key_path": f'{key_path}.{table}',
-            "value": transmit_data
         }
-        resp = session.post(self.base_url+"/api/client-data/extend", data=json.dumps(data))
+        return self._post("/api/client-data/extend", self._body(data, transmit_data))
+
+    def extend_data(self, key_path, table, transmit_data):
+
+        resp = self._extend_request(key_path, table, transmit_data)
         if resp.status_code == 200:
             return True
         else:
@@ -50,13 +184,96 @@ class API:
             print(f"{current_time} - chunk transmission failure: {resp}")
             return False
 
+    @staticmethod
+    def _retry_after(resp):
+        '''
+        Returns the seconds a response asks to wait via Retry-After, or None.
+        '''
+        value = resp.headers.get("Retry-After") if resp is not None else None
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, (parsedate_to_datetime(value) - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _not_sent(error):
+        '''
+        Whether a request failed before anything was sent, so retrying it is safe.
+        '''
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        reason = getattr(error.args[0], "reason", None) if error.args else None
+        return isinstance(error, requests.ConnectionError) and isinstance(reason, NewConnectionError)
+
+    def upload_chunks(self, key_path, table, chunks):
+        '''
+        Appends every chunk of rows (lists or DataFrames) to `key_path.table`, several
+        at a time, and returns the number of rows that could not be uploaded. Each
+        chunk is only serialized when its request is sent. Progress is shown per chunk.
+        '''
+        limit = _AdaptiveConcurrency(self.pool_size)
+        pending = deque((chunk, 0) for chunk in chunks)
+        running = {}
+        failed_rows = 0
+
+        with ThreadPoolExecutor(max_workers=self.pool_size) as pool, tqdm(total=len(chunks), desc=f"Uploading {table} data", unit="chunks") as progress:
+            while pending or running:
+                while pending and len(running) < limit.limit and limit.pause_remaining() == 0:
+                    chunk, attempt = pending.popleft()
+                    future = pool.submit(self._extend_request, key_path, table, chunk)
+                    running[future] = (chunk, attempt, time.monotonic())
+
+                if not running:
+                    time.sleep(limit.pause_remaining())
+                    continue
+
+                # Wake up when a pause ends, so waiting chunks don't wait for a slow response
+                timeout = (limit.pause_remaining() or None) if pending else None
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chunk, attempt, started = running.pop(future)
+                    latency = time.monotonic() - started
+                    try:
+                        resp, error = future.result(), None
+                    except requests.RequestException as e:
+                        resp, error = None, e
+
+                    if resp is not None and resp.status_code == 200:
+                        limit.succeeded(started, latency)
+                        progress.update(1)
+                        continue
+
+                    overloaded = resp is None or resp.status_code == 429 or resp.status_code >= 500
+                    if overloaded:
+                        retry_after = self._retry_after(resp)
+                        limit.failed(started, retry_after if retry_after is not None else 0.5 * 2 ** attempt)
+
+                    # Only a chunk the server surely did not append is safe to send again
+                    if resp is not None:
+                        retryable = resp.status_code == 429 or (self.retry_unsafe and resp.status_code >= 500)
+                    else:
+                        retryable = self._not_sent(error) or self.retry_unsafe
+                    if retryable and attempt < self.max_retries:
+                        pending.append((chunk, attempt + 1))
+                        continue
+
+                    print(f"{datetime.datetime.now()} - chunk transmission failure: {resp if resp is not None else error}")
+                    failed_rows += len(chunk)
+                    progress.update(1)
+
+        return failed_rows
+
     def send_table(self, df, key_path, table):
-        
-        df_json_f = df.to_json(orient='records', default_handler=str)
-        df_json = json.loads(df_json_f)
 
-        if len(df_json) < 50_000:
-            return self.send_data(key_path, table, df_json)
+        # Rows are serialized per request, straight from the DataFrame
+        if len(df) < 50_000:
+            return self.send_data(key_path, table, df)
         else:
             print(f"{datetime.datetime.now()}: Table is too large, initializing in API and chunking data...")
             self.send_data(key_path, table, [])
@@ -64,59 +281,31 @@ class API:
 
             print(f"{datetime.datetime.now()}: Chunking data for transmission...")
             chunk_size = 20_000
-            chunks = [df_json[i:i + chunk_size] for i in range(0, len(df_json), chunk_size)]
+            chunks = [df.iloc[i:i + chunk_size] for i in range(0, len(df), chunk_size)]
             print(f"{datetime.datetime.now()}: Chunks to transmit: {len(chunks)}")
 
-            failed_rows = []
-            status_message = ""
-            n = 0
-
             print(f"{datetime.datetime.now()}: Beginning transmission of chunks...")
-            for chunk in tqdm(chunks, desc=f"Uploading {table} data", unit="chunks"):
-                n+=1
+            failed_rows = self.upload_chunks(key_path, table, chunks)
 
-                status = self.extend_data(key_path, table, chunk)
-                status_message += f"- Chunk {n} Transmit Success: {status}\n"
-
-                if not status:
-                    failed_rows += chunk
-
-                time.sleep(1)
-            
-            print(f"{table} had {len(failed_rows)} failed rows")
-            return status
+            print(f"{table} had {failed_rows} failed rows")
+            return failed_rows == 0
 
     def append_table(self, df, key_path, table):
 
         # TODO: Add checking that the table to extend exists.
-        
-        df_json_f = df.to_json(orient='records', default_handler=str)
-        df_json = json.loads(df_json_f)
 
-        if len(df_json) < 50_000:
-            return self.extend_data(key_path, table, df_json)
+        if len(df) < 50_000:
+            return self.extend_data(key_path, table, df)
         else:
             print(f"{datetime.datetime.now()}: Chunking data for transmission...")
             chunk_size = 20_000
-            chunks = [df_json[i:i + chunk_size] for i in range(0, len(df_json), chunk_size)]
-
-            failed_rows = []
-            status_message = ""
-            n = 0
+            chunks = [df.iloc[i:i + chunk_size] for i in range(0, len(df), chunk_size)]
 
             print(f"{datetime.datetime.now()}: Beginning transmission of chunks...")
-            for chunk in tqdm(chunks, desc=f"Uploading {table} data", unit="chunks"):
-                n+=1
-
-                status = self.extend_data(key_path, table, chunk)
-                status_message += f"- Chunk {n} Transmit Success: {status}\n"
-                if not status:
-                    failed_rows += chunk
-
-                time.sleep(1)
-            
-            print(f"{table} had {len(failed_rows)} failed rows")
-            return status
+            failed_rows = self.upload_chunks(key_path, table, chunks)
+
+            print(f"{table} had {failed_rows} failed rows")
+            return failed_rows == 0
 
 # Transmitting Data
 # current_time = datetime.datetime.utcnow()
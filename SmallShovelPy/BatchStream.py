@@ -0,0 +1,76 @@
+import queue
+import threading
+import contextvars
+
+
+class _Failure:
+    def __init__(self, error):
+        self.error = error
+
+
+_DONE = object()
+
+
+class BatchStream:
+    """
+    Stream of batches produced by a task that returned a generator or iterator.
+    Once a consumer starts iterating, a background thread drains the source into a
+    bounded queue, so the producer runs at most `maxsize` batches ahead.
+    """
+    def __init__(self, source, maxsize=8):
+        self.source = source
+        self.maxsize = maxsize
+        self.batches = 0
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._started = False
+        self._closed = threading.Event()
+        # The producer runs in the context the stream was created in, so its prints
+        # and log lines are attributed to the task that returned it
+        self._context = contextvars.copy_context()
+
+    def _put(self, item):
+        # Wake up regularly so an abandoned stream does not pin the producer forever
+        while not self._closed.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _produce(self):
+        try:
+            for batch in self.source:
+                if not self._put(batch):
+                    return
+        except BaseException as e:
+            self._put(_Failure(e))
+        else:
+            self._put(_DONE)
+
+    def __iter__(self):
+        with self._lock:
+            if self._started:
+                raise RuntimeError("A BatchStream can only be consumed once.")
+            self._started = True
+
+        threading.Thread(target=self._context.run, args=(self._produce,), daemon=True).start()
+
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, _Failure):
+                    raise item.error
+                self.batches += 1
+                yield item
+        finally:
+            self.close()
+
+    def close(self):
+        self._closed.set()
+
+    def __repr__(self):
+        return f"BatchStream(maxsize={self.maxsize}, batches={self.batches})"
@@ -0,0 +1,113 @@
+import os
+import json
+import uuid
+import pickle
+import datetime
+try:
+    from SmallShovelPy.DataChannel import DataHandle
+except ModuleNotFoundError:
+    try:
+        from DataChannel import DataHandle
+    except ImportError as e:
+        raise ImportError(f"Could not import DataChannel: {e}")
+
+
+class CheckpointStore:
+    """
+    Persists each task's output and success status per pipeline run, so a failed
+    run can be resumed with `Pipeline.resume(run_id)`.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _run_dir(self, run_id):
+        return os.path.join(self.directory, run_id)
+
+    def start_run(self, pipeline_name, params, run_id=None):
+        '''
+        Creates a new run and returns its ID. Reusing an existing `run_id` keeps its
+        checkpointed tasks.
+        '''
+        run_id = run_id or f"{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        run_dir = self._run_dir(run_id)
+        os.makedirs(run_dir, exist_ok=True)
+
+        with open(os.path.join(run_dir, "run.json"), "w") as file:
+            json.dump({
+                "run_id": run_id,
+                "pipeline": pipeline_name,
+                "started_at": datetime.datetime.now().isoformat(),
+            }, file, indent=4)
+
+        try:
+            with open(os.path.join(run_dir, "params.pkl"), "wb") as file:
+                pickle.dump(params, file, protocol=4)
+        except Exception:
+            # Params that cannot be pickled have to be passed to resume() again
+            pass
+
+        return run_id
+
+    def save(self, run_id, task_index, output, succeeded):
+        '''
+        Stores one task result. Outputs that cannot be pickled, and DataHandles whose
+        data is released when the run ends, are recorded as not persisted, and those
+        tasks are run again on resume.
+        '''
+        run_dir = self._run_dir(run_id)
+        try:
+            if isinstance(output, DataHandle):
+                raise ValueError("Published data does not outlive the run.")
+            data = pickle.dumps({"succeeded": succeeded, "output": output, "persisted": True}, protocol=4)
+        except Exception:
+            data = pickle.dumps({"succeeded": succeeded, "output": None, "persisted": False}, protocol=4)
+
+        # Write then rename so a crash mid-write never leaves a half checkpoint behind
+        path = os.path.join(run_dir, f"task_{task_index}.pkl")
+        with open(f"{path}.tmp", "wb") as file:
+            file.write(data)
+        os.replace(f"{path}.tmp", path)
+
+    def load(self, run_id):
+        '''
+        Returns {"pipeline", "params", "tasks"} for a run, where "tasks" maps each
+        checkpointed task index to its {"succeeded", "output", "persisted"} record.
+        '''
+        run_dir = self._run_dir(run_id)
+        if not os.path.isdir(run_dir):
+            raise ValueError(f"No checkpoint found for run '{run_id}'.")
+
+        with open(os.path.join(run_dir, "run.json"), "r") as file:
+            run = json.load(file)
+
+        params = None
+        if os.path.isfile(os.path.join(run_dir, "params.pkl")):
+            with open(os.path.join(run_dir, "params.pkl"), "rb") as file:
+                params = pickle.load(file)
+
+        tasks = {}
+        for name in os.listdir(run_dir):
+            if name.startswith("task_") and name.endswith(".pkl"):
+                with open(os.path.join(run_dir, name), "rb") as file:
+                    tasks[int(name[len("task_"):-len(".pkl")])] = pickle.load(file)
+
+        return {"pipeline": run["pipeline"], "params": params, "tasks": tasks}
+
+    def runs(self, pipeline_name=None):
+        '''
+        Lists the run IDs in the store, oldest first, optionally for one pipeline.
+        '''
+        runs = []
+        for run_id in sorted(os.listdir(self.directory)):
+            manifest = os.path.join(self._run_dir(run_id), "run.json")
+            if not os.path.isfile(manifest):
+                continue
+            with open(manifest, "r") as file:
+                run = json.load(file)
+            if pipeline_name is None or run["pipeline"] == pipeline_name:
+                runs.append(run_id)
+        return runs
+
+    def __repr__(self):
+        return f"CheckpointStore(directory={self.directory})"
@@ -13,7 +13,7 @@ import sys
 import os
 import datetime
 try:
-    from SmallShovelPy import Pipeline
+    from SmallShovelPy.Pipeline import Pipeline
 except ModuleNotFoundError or TypeError:
     try:
         from Pipeline import Pipeline
@@ -22,27 +22,27 @@ except ModuleNotFoundError or TypeError:
 
 try:
     from SmallShovelPy import Logger
-    logger = Logger("my_log", log_as_stdout=True, broadcast_logs=True, port=7001)
+    logger = Logger("my_log", log_as_stdout=True, broadcast_logs=True, port=7001, async_write=True, max_bytes=50 * 1024 * 1024, backup_count=10, stream_capacity=10000)
 except ModuleNotFoundError:
     try:
         from Logger import Logger
-        logger = Logger("my_log", log_as_stdout=True, broadcast_logs=True, port=7001)
+        logger = Logger("my_log", log_as_stdout=True, broadcast_logs=True, port=7001, async_write=True, max_bytes=50 * 1024 * 1024, backup_count=10, stream_capacity=10000)
     except ImportError as e:
         raise ImportError(f"Could not import Logger: {e}")
 except TypeError:
     try:
         from SmallShovelPy import Logger
-        logger = Logger.Logger("my_log", log_as_stdout=True, broadcast_logs=True, port=7001)
+        logger = Logger.Logger("my_log", log_as_stdout=True, broadcast_logs=True, port=7001, async_write=True, max_bytes=50 * 1024 * 1024, backup_count=10, stream_capacity=10000)
     except ImportError as e:
         raise ImportError(f"Could not import Logger: {e}")
     except:
         from Logger import Logger
-        logger = Logger.Logger("my_log", log_as_stdout=True, broadcast_logs=True, port=7001)
+        logger = Logger.Logger("my_log", log_as_stdout=True, broadcast_logs=True, port=7001, async_write=True, max_bytes=50 * 1024 * 1024, backup_count=10, stream_capacity=10000)
 
 class Client:
     active_clients = []
 
-    def __init__(self, client_name=None, save_file=None):
+    def __init__(self, client_name=None, save_file=None, structured_logs=False):
         self.scheduler = BackgroundScheduler()
         self.pipelines = {}
         self.schedules = {}
@@ -64,6 +64,11 @@ class Client:
         elif not save_file and not client_name:
             raise ValueError("Must specify client name or config file.")
 
+        # Structured log records carry the client name, see `logs <pipeline> [run]`
+        logger.client = self.client_name
+        if structured_logs:
+            logger.structured = True
+
     def load_from_save(self, config_file):
         import json
 
@@ -92,18 +97,19 @@ class Client:
         self.client_ports = {}
 
         for pipe_data in config['pipelines']:
-            pipeline = Pipeline(name=pipe_data['name'])
+            pipeline = Pipeline(name=pipe_data['name'], logger=logger)
 
             for task in pipe_data['tasks']:
                 task_type = task['task_type']
+                depends_on = task.get('depends_on')
                 if task_type == 'func':
                     func = restore_function(task['source'])
                     if func:
-                        pipeline.add_task(func=func)
+                        pipeline.add_task(func=func, depends_on=depends_on, cache=task.get('cache', False), streaming=task.get('streaming', False), publish=task.get('publish', False))
                 elif task_type == 'file':
-                    pipeline.add_task(file=task['path'])
+                    pipeline.add_task(file=task['path'], depends_on=depends_on, stream_output=task.get('stream_output'), cache=task.get('cache', False))
                 elif task_type == 'shell':
-                    pipeline.add_task(shell=task['shell'], command=task['command'])
+                    pipeline.add_task(shell=task['shell'], command=task['command'], depends_on=depends_on, stream_output=task.get('stream_output'), cache=task.get('cache', False), mode=task.get('mode', 'shell'))
 
             self.pipelines[pipeline.name] = pipeline
 
@@ -115,6 +121,9 @@ class Client:
     def add_pipeline(self, pipeline):
         if pipeline.name in self.pipelines:
             raise ValueError(f"Pipeline with name '{pipeline.name}' already exists.")
+        if pipeline.logger is None:
+            # Run records are written through the logger, `show run` reads them back
+            pipeline.logger = logger
         self.pipelines[pipeline.name] = pipeline
 
     def show_pipelines(self):
@@ -141,10 +150,13 @@ class Client:
         return df.to_markdown(index=False)
     
     @logger.capture_output
-    def run_pipeline(self, pipeline_name):
+    def run_pipeline(self, pipeline_name, with_record=False):
         print(f"Running pipeline: {pipeline_name}")
         pipeline = self.pipelines[pipeline_name]
-        return pipeline.execute()
+        outputs = pipeline.execute()
+        if with_record:
+            return outputs, pipeline.last_run.to_dict()
+        return outputs
 
     def schedule_pipeline(self, pipeline_name, trigger_type, **trigger_kwargs):
         if pipeline_name not in self.pipelines:
@@ -197,8 +209,8 @@ class Client:
             # Remove the scheduled job if it exists
             self.unschedule_pipeline(pipeline_name)
 
-            # Remove the pipeline from my records
-            del self.pipelines[pipeline_name]
+            # Remove the pipeline from my records, along with the data it published
+            self.pipelines.pop(pipeline_name).close()
             print(f"Pipeline '{pipeline_name}' has been removed.")
             return True
 
@@ -300,6 +312,8 @@ class Client:
         """Stop the scheduler and service threads cleanly."""
         self.running = False
         self.stop_scheduler()
+        for pipeline in self.pipelines.values():
+            pipeline.close()
 
         # TODO: Send "exit" message to any other running clients
 
@@ -339,9 +353,15 @@ class Client:
                 self.port = port
                 logger.port = port + 2000
                 print(logger.port)
+                try:
+                    # Shells subscribe here to tail the log, see ClientShell `listen`
+                    logger.stream.serve(port + 3000)
+                except OSError as e:
+                    print(f"Unable to serve the log stream on port {port + 3000}: {e}")
                 logger.write("log init")
                 if self.client_name in self.client_ports.keys():
                     self.client_name = f"{self.client_name}-{self.port}"
+                    logger.client = self.client_name
                     print(f"Client of same name was already running. Client name has been updated to: {self.client_name}")
                 break
 
@@ -419,18 +439,29 @@ class Client:
                 if task_type == "func":
                     pipeline_data["tasks"].append({
                         "task_type": "func",
-                        "source": get_function_source(task_obj)
+                        "source": get_function_source(task_obj),
+                        "depends_on": task.get('depends_on', []),
+                        "cache": bool(task.get('cache')),
+                        "streaming": task.get('streaming', False),
+                        "publish": task.get('publish', False)
                     })
                 elif task_type == "file":
                     pipeline_data["tasks"].append({
                         "task_type": "file",
-                        "path": task_obj
+                        "path": task_obj,
+                        "depends_on": task.get('depends_on', []),
+                        "stream_output": task.get('stream_output'),
+                        "cache": bool(task.get('cache'))
                     })
                 elif task_type == "shell":
                     pipeline_data["tasks"].append({
                         "task_type": "shell",
                         "shell": task_obj['shell'],
-                        "command": task_obj['command']
+                        "command": task_obj['command'],
+                        "mode": task_obj.get('mode', 'shell'),
+                        "depends_on": task.get('depends_on', []),
+                        "stream_output": task.get('stream_output'),
+                        "cache": bool(task.get('cache'))
                     })
 
             # Add schedules (may be multiple per pipeline)
@@ -469,7 +500,28 @@ class Client:
 
         elif cmd == "show" and len(parts) > 1 and parts[1] == "pipelines":
             return self.show_pipelines() or "No pipelines available."
+
+        elif cmd == "show" and len(parts) > 2 and parts[1] == "run":
+            pipeline_name = parts[2]
+            if pipeline_name not in self.pipelines.keys():
+                return f"No pipeline with name {pipeline_name}"
+            elif self.pipelines[pipeline_name].last_run is None:
+                return f"Pipeline {pipeline_name} has not been run yet."
+            else:
+                # The full JSON record does not fit in one 1 KB reply
+                return self.pipelines[pipeline_name].last_run.summary()
         
+        elif cmd == "logs" and len(parts) > 1:
+            # Only the log location is sent back, the shell reads the records itself
+            if not logger.structured:
+                return "Structured logging is not enabled for this client."
+            logger.flush()
+            return json.dumps({
+                "log": os.path.abspath(logger.filename),
+                "pipeline": parts[1],
+                "run_id": parts[2] if len(parts) > 2 else None,
+            })
+
         elif cmd == "run" and len(parts) > 2 and parts[1] == "pipeline":
             pipeline_name = parts[2]
             if pipeline_name in self.pipelines.keys():
@@ -536,7 +588,7 @@ class Client:
             if pipeline_name in self.pipelines.keys():
                 return f"Pipeline with name {pipeline_name} already exists"
             else:
-                pipeline = Pipeline(name=pipeline_name)
+                pipeline = Pipeline(name=pipeline_name, logger=logger)
                 self.add_pipeline(pipeline)
                 return self.show_pipelines()
         
@@ -573,7 +625,7 @@ if __name__ == "__main__":
         print("Task 1 complete.")
         return "Output of task 1"
 
-    p1 = Pipeline(name="P1")
+    p1 = Pipeline(name="P1", logger=logger)
     p1.add_task(sample)
 
     client.add_pipeline(p1)
@@ -1,10 +1,32 @@
 import socket
 import threading
 import json
+import datetime
 import pandas as pd
 from prompt_toolkit import PromptSession
 from prompt_toolkit.completion import WordCompleter
 from prompt_toolkit.history import FileHistory
+try:
+    from SmallShovelPy.LogBroadcaster import DatagramAssembler
+except ModuleNotFoundError:
+    try:
+        from LogBroadcaster import DatagramAssembler
+    except ImportError as e:
+        raise ImportError(f"Could not import LogBroadcaster: {e}")
+try:
+    from SmallShovelPy.LogStream import LogStream
+except ModuleNotFoundError:
+    try:
+        from LogStream import LogStream
+    except ImportError as e:
+        raise ImportError(f"Could not import LogStream: {e}")
+try:
+    from SmallShovelPy.LogIndex import LogIndex
+except ModuleNotFoundError:
+    try:
+        from LogIndex import LogIndex
+    except ImportError as e:
+        raise ImportError(f"Could not import LogIndex: {e}")
 
 class ClientShell:
     def __init__(self):
@@ -17,6 +39,9 @@ Available commands:
   - select client <client_name>: Select a specific client to interact with.
   - show pipelines: Show pipelines for the selected client.
   - run pipeline <pipeline_name>: Run a specific pipeline on the selected client.
+  - listen [N | since <time>]: Tail the selected client's log, starting with its last N lines (100 by default) or the lines since an ISO time.
+  - show run <pipeline_name>: Show a summary of the timing and resource record of the pipeline's last run.
+  - logs <pipeline_name> [run_id]: Show the log records of a pipeline run, the latest one by default. Needs structured logs.
   - create pipeline <pipeline_name>:
   - update pipeline
   - shutdown: Shutdown the selected client.
@@ -57,7 +82,25 @@ Available commands:
         except Exception as e:
             return f"Error: {e}"
         
+    def follow_logs(self, port, last=None, since=None):
+        '''
+        Prints the selected client's log lines from its LogStream until interrupted.
+        '''
+        print("Listening for log lines...")
+        try:
+            for frame in LogStream.subscribe('127.0.0.1', port, last=last, since=since):
+                if "error" in frame:
+                    print(frame["error"])
+                elif "dropped" in frame:
+                    print(f"... {frame['dropped']} log lines were missed ...")
+                else:
+                    print(frame["line"])
+            print("The client closed the log stream.")
+        except KeyboardInterrupt:
+            print("Stopped listening.")
+
     def listen_for_logs(self, port):
+        assembler = DatagramAssembler()
         client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
         client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
@@ -67,23 +110,51 @@ Available commands:
 
         try:
             while True:
-                data, addr = client_socket.recvfrom(1024)  # Buffer size is 1024 bytes, if logs get too big this may need to expanded
-                message = data.decode("utf-8")
+                data, addr = client_socket.recvfrom(65535)  # Largest possible UDP datagram
+                message = assembler.feed(data, addr)
+                if message is None:
+                    continue  # Waiting for the rest of a fragmented message
                 # TODO: Tune these print outs to either include the addr or selected client name.
                 print(f"{message}")
         except KeyboardInterrupt:
             print("Stopped listening.")
             client_socket.close()
 
+    def show_logs(self, resp):
+        '''
+        Prints the records of the pipeline run described by a `logs` response, read
+        straight from the client's log file through its index.
+        '''
+        try:
+            query = json.loads(resp)
+        except ValueError:
+            print(resp)
+            return
+
+        run_id = query['run_id']
+        if run_id is None:
+            spans = LogIndex.find(query['log'], query['pipeline'])
+            if not spans:
+                print(f"No log records found for pipeline {query['pipeline']}")
+                return
+            run_id = max(spans, key=lambda found: found[1]['start'])[1]['run_id']
+
+        count = 0
+        for record in LogIndex.read(query['log'], query['pipeline'], run_id):
+            print(f"{record['time']} - {record['level']:<5} - {'    ' * record['depth']}{record['message']}")
+            count += 1
+        if count == 0:
+            print(f"No log records found for run {run_id} of pipeline {query['pipeline']}")
+
     def shell(self):
         """Start an interactive shell with prompt_toolkit."""
         print("Checking for active clients...")
         self.get_active_clients()
 
         base_commands = [
-            "show clients", "select client", "show pipelines", "run pipeline",
+            "show clients", "select client", "show pipelines", "show run", "run pipeline",
             "create pipeline", "update pipeline", "remove pipeline",
-            "shutdown", "ex", "exit", "help", "listen"
+            "shutdown", "ex", "exit", "help", "listen", "logs"
         ]
         completer = WordCompleter(base_commands, ignore_case=True)
         session = PromptSession(
@@ -125,14 +196,28 @@ Available commands:
                     self.selected_client = client_name
                     print(f"Selected client: {client_name}")
 
-                elif command == "listen":
+                elif command == "listen" or command.startswith("listen "):
                     print("Listener is trying...")
-                    if self.selected_client:
-                        port = self.client_ports[self.selected_client] + 2000
-                        print("Initiating listen_for_logs()")
-                        self.listen_for_logs(port)
-                    else:
+                    parts = command.split(maxsplit=2)
+                    if not self.selected_client:
                         print("You must select a client to listen to.")
+                        continue
+                    try:
+                        if len(parts) > 2 and parts[1] == "since":
+                            start = {"since": datetime.datetime.fromisoformat(parts[2]).timestamp()}
+                        else:
+                            start = {"last": int(parts[1]) if len(parts) > 1 else 100}
+                    except ValueError:
+                        print("Usage: listen [N | since <time>], e.g. listen 500 or listen since 2025-01-01 12:00:00")
+                        continue
+
+                    port = self.client_ports[self.selected_client]
+                    try:
+                        self.follow_logs(port + 3000, **start)
+                    except ConnectionRefusedError:
+                        # Clients without a log stream still broadcast their lines
+                        print("Initiating listen_for_logs()")
+                        self.listen_for_logs(port + 2000)
 
                 elif command == "show pipelines":
                     if not self.selected_client:
@@ -143,6 +228,14 @@ Available commands:
                         resp = self.send_command(host='127.0.0.1', port=port, command=command)
                         print(resp)
 
+                elif command.startswith("show run "):
+                    if not self.selected_client:
+                        print("No client selected. Use 'select client <client_name>' first.")
+                    else:
+                        port = self.client_ports[self.selected_client]
+                        resp = self.send_command(host='127.0.0.1', port=port, command=command)
+                        print(resp)
+
                 elif command.startswith("run pipeline "):
                     if not self.selected_client:
                         print("No client selected. Use 'select client <client_name>' first.")
@@ -151,6 +244,14 @@ Available commands:
                         resp = self.send_command(host='127.0.0.1', port=port, command=command)
                         print(resp)
 
+                elif command.startswith("logs "):
+                    if not self.selected_client:
+                        print("No client selected. Use 'select client <client_name>' first.")
+                    else:
+                        port = self.client_ports[self.selected_client]
+                        resp = self.send_command(host='127.0.0.1', port=port, command=command)
+                        self.show_logs(resp)
+
                 elif command.startswith("shutdown"):
                     parts = command.split()
                     if self.selected_client:
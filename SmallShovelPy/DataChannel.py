@@ -0,0 +1,210 @@
+import os
+import json
+import uuid
+import atexit
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+
+
+URI_PREFIX = "smallshovel-data://"
+CHANNEL_PREFIX = "smallshovel_channel_"
+# Set for task subprocesses, whose published data belongs to the parent pipeline
+PERSIST_ENV = "SMALLSHOVEL_CHANNEL_PERSIST"
+
+
+def task_environment():
+    '''
+    Returns the environment for a task subprocess: channels it creates are not
+    closed when it exits, so the handles it prints stay valid for the parent.
+    '''
+    return dict(os.environ, **{PERSIST_ENV: "1"})
+
+
+def _default_directory():
+    # /dev/shm is RAM backed where it exists, so mapped files never touch disk
+    root = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    return tempfile.mkdtemp(prefix=CHANNEL_PREFIX, dir=root)
+
+
+def _save_array(path, array):
+    if array.dtype == object:
+        # Python objects cannot be memory-mapped, they are pickled and copied on open
+        np.save(path, array, allow_pickle=True)
+        return False
+
+    mapped = np.lib.format.open_memmap(path, mode="w+", dtype=array.dtype, shape=array.shape)
+    mapped[...] = array
+    mapped.flush()
+    del mapped
+    return True
+
+
+def _load_array(path, mapped):
+    if mapped:
+        # Copy-on-write mapping: readers share the pages, writes stay private
+        return np.load(path, mmap_mode="c")
+    return np.load(path, allow_pickle=True)
+
+
+class DataHandle:
+    """
+    Reference to a DataFrame or NumPy array published to a DataChannel. Handles are
+    small, picklable and turn into a `smallshovel-data://` URI with `str()`, so they
+    can be passed to file and shell tasks on the command line.
+    """
+    def __init__(self, manifest_path):
+        self.manifest_path = manifest_path
+
+    @classmethod
+    def from_uri(cls, uri):
+        if not uri.startswith(URI_PREFIX):
+            raise ValueError(f"Not a data channel URI: {uri}")
+        return cls(uri[len(URI_PREFIX):])
+
+    @property
+    def manifest(self):
+        with open(self.manifest_path, "r") as file:
+            return json.load(file)
+
+    def open(self):
+        '''
+        Maps the published data back into memory without copying numeric arrays.
+        '''
+        manifest = self.manifest
+        directory = os.path.dirname(self.manifest_path)
+
+        def load(entry):
+            return _load_array(os.path.join(directory, entry["file"]), entry["mapped"])
+
+        if manifest["kind"] == "ndarray":
+            return load(manifest["data"])
+
+        columns = load(manifest["columns"])
+        index = load(manifest["index"]) if manifest["index"] else None
+
+        if manifest["kind"] == "frame":
+            # One homogeneous block, pandas wraps the mapping without a copy
+            return pd.DataFrame(load(manifest["data"]), columns=columns, index=index, copy=False)
+
+        # Mixed dtypes are stored per column; pandas may consolidate them on construction
+        data = {column: load(entry) for column, entry in zip(columns, manifest["data"])}
+        return pd.DataFrame(data, columns=columns, index=index)
+
+    def release(self, prune=False):
+        '''
+        Deletes the published files. The handle cannot be opened afterwards.
+        With `prune`, the channel's temporary directory goes too once it is empty,
+        for data left behind by a task subprocess whose channel nobody closes.
+        '''
+        entry = os.path.dirname(self.manifest_path)
+        shutil.rmtree(entry, ignore_errors=True)
+        channel = os.path.dirname(entry)
+        if prune and os.path.basename(channel).startswith(CHANNEL_PREFIX):
+            try:
+                os.rmdir(channel)
+            except OSError:
+                pass
+
+    def __str__(self):
+        return f"{URI_PREFIX}{self.manifest_path}"
+
+    def __eq__(self, other):
+        return isinstance(other, DataHandle) and other.manifest_path == self.manifest_path
+
+    def __hash__(self):
+        return hash(self.manifest_path)
+
+    def __repr__(self):
+        return f"DataHandle({self.manifest_path})"
+
+
+class DataChannel:
+    """
+    Typed data channel between tasks. `publish` writes a DataFrame or NumPy array to
+    memory-mapped .npy files and returns a DataHandle; any task in this process or a
+    subprocess can `open` the handle and map the data without copying it.
+    A channel in its own temporary directory is closed at exit at the latest, unless
+    `persist` is set. It defaults to True inside task subprocesses.
+    """
+    def __init__(self, directory=None, persist=None):
+        self.directory = directory or _default_directory()
+        self.persist = os.environ.get(PERSIST_ENV) == "1" if persist is None else persist
+        os.makedirs(self.directory, exist_ok=True)
+        if directory is None and not self.persist:
+            # /dev/shm is not cleaned up when the process ends
+            atexit.register(self.close)
+
+    def publish(self, data):
+        if isinstance(data, np.ndarray):
+            return self._publish_array(data)
+        elif isinstance(data, pd.DataFrame):
+            return self._publish_frame(data)
+        else:
+            raise ValueError(f"Only DataFrames and NumPy arrays can be published, not {type(data).__name__}.")
+
+    def _new_entry(self):
+        path = os.path.join(self.directory, uuid.uuid4().hex)
+        os.makedirs(path)
+        return path
+
+    def _write_manifest(self, path, manifest):
+        manifest_path = os.path.join(path, "manifest.json")
+        with open(manifest_path, "w") as file:
+            json.dump(manifest, file)
+        return DataHandle(manifest_path)
+
+    def _publish_array(self, array):
+        path = self._new_entry()
+        mapped = _save_array(os.path.join(path, "data.npy"), array)
+        return self._write_manifest(path, {
+            "kind": "ndarray",
+            "data": {"file": "data.npy", "mapped": mapped},
+        })
+
+    def _publish_frame(self, df):
+        path = self._new_entry()
+
+        _save_array(os.path.join(path, "columns.npy"), np.asarray(list(df.columns), dtype=object))
+        index = None
+        if not (isinstance(df.index, pd.RangeIndex) and df.index.start == 0 and df.index.step == 1):
+            index = {"file": "index.npy", "mapped": _save_array(os.path.join(path, "index.npy"), df.index.to_numpy())}
+
+        dtypes = set(df.dtypes)
+        if len(dtypes) == 1 and df.dtypes.iloc[0] != object and isinstance(df.dtypes.iloc[0], np.dtype):
+            kind = "frame"
+            data = {"file": "data.npy", "mapped": _save_array(os.path.join(path, "data.npy"), df.to_numpy())}
+        else:
+            kind = "columns"
+            data = []
+            for n, column in enumerate(df.columns):
+                values = df.iloc[:, n].to_numpy()
+                if not isinstance(values, np.ndarray) or values.dtype.kind not in "biufcmMb":
+                    values = np.asarray(values, dtype=object)
+                data.append({"file": f"column_{n}.npy", "mapped": _save_array(os.path.join(path, f"column_{n}.npy"), values)})
+
+        return self._write_manifest(path, {
+            "kind": kind,
+            "columns": {"file": "columns.npy", "mapped": False},
+            "index": index,
+            "data": data,
+        })
+
+    @staticmethod
+    def open(handle):
+        '''
+        Opens a DataHandle or a `smallshovel-data://` URI received on the command line.
+        '''
+        if isinstance(handle, str):
+            handle = DataHandle.from_uri(handle)
+        return handle.open()
+
+    def close(self):
+        '''
+        Deletes every piece of data published through this channel.
+        '''
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __repr__(self):
+        return f"DataChannel(directory={self.directory})"
@@ -1,60 +1,120 @@
 import sys
+import time
 import functools
 from datetime import datetime
 import socket
+try:
+    from SmallShovelPy.LogContext import LogContext
+except ModuleNotFoundError:
+    try:
+        from LogContext import LogContext
+    except ImportError as e:
+        raise ImportError(f"Could not import LogContext: {e}")
+
+
+# Leading markers that set the level of a captured line
+LEVEL_MARKERS = (("Debug: ", "DEBUG"), ("Warning: ", "WARN"))
+
+
+class _Record:
+    """
+    A captured line whose timestamp and message strings are only built when the line
+    is written to the log. Read like the dicts capture_output puts in its buffer.
+    """
+    __slots__ = ("created", "prefix", "text", "level", "context")
+
+    def __init__(self, created, prefix, text, level, context):
+        self.created = created
+        self.prefix = prefix
+        self.text = text
+        self.level = level
+        self.context = context
+
+    def __getitem__(self, key):
+        if key == "Time":
+            return f"{datetime.fromtimestamp(self.created)}"
+        if key == "Message":
+            return f"{self.prefix}{self.text}"
+        if key == "Level":
+            return f" - {self.level:<5} - "
+        if key == "Context":
+            return self.context
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
 
 
 class DualOutput:
     """
     Custom stream for dual output: real-time printing and buffer capture.
+
+    Lines below the logger's level, or left out by its sampling, are dropped before
+    anything is formatted. The real stdout is flushed at most every `flush_interval`
+    seconds and when the capture ends.
     """
-    def __init__(self, capture_prefix="", stdout_prefix="", indent_level=0, log_as_stdout=None, logger=None):
+    def __init__(self, capture_prefix="", stdout_prefix="", indent_level=0, log_as_stdout=None, logger=None, original_stdout=None, flush_interval=0.1):
         self.capture_prefix = capture_prefix
         self.stdout_prefix = stdout_prefix
         self.buffer = []
-        self.original_stdout = sys.stdout
+        # The stream that was active for this context before capturing started
+        self.original_stdout = original_stdout if original_stdout is not None else sys.stdout
         self.indent_level = indent_level
         self.log_as_stdout = log_as_stdout
         self.logger = logger
+        self.flush_interval = flush_interval
+        self._flushed = time.monotonic()
+        self._dropped = False
 
     def write(self, message):
-        current_time = f"{datetime.now()}"
-
         if message.strip():
             if "Captured Error: " in message:
                 message = message.replace("Captured Error: ", "")
-                level = " - ERROR - "
-                prefix = f"{current_time} - ERROR - "
+                level = "ERROR"
             else:
-                prefix = f"{current_time} - INFO  - "
-                level = " - INFO  - "
+                level = "INFO"
+                for marker, marked_level in LEVEL_MARKERS:
+                    if message.startswith(marker):
+                        level = marked_level
+                        break
+
+            context = LogContext.current()
+            self._dropped = not self.logger.accepts(level, context)
+            if self._dropped:
+                if not self.log_as_stdout:
+                    self._echo(message)
+                return
 
             # Apply indentation for sub-function output
-            indent = "    " * self.indent_level
-            stdout_message = f"{prefix}{self.stdout_prefix}{indent}{message}"
-
-            capture_message = {
-                "Time": current_time,
-                "Message": f"{self.capture_prefix}{indent}{message}",
-                "Level": level,
-            }
-            if capture_message['Message'].strip() not in self.logger.log_history:
-                self.buffer.append(capture_message)
-        else:
-            stdout_message = message
+            record = _Record(time.time(), self.capture_prefix + "    " * self.indent_level, message, level, context)
+            if message.strip() not in self.logger.log_history:
+                self.buffer.append(record)
 
+            if self.log_as_stdout:
+                self._echo(f"{record['Time']}{record['Level']}{self.stdout_prefix}{'    ' * self.indent_level}{message}")
+            else:
+                self._echo(message)
+
+        elif not (self._dropped and self.log_as_stdout):
+            # The newline print() sends after a dropped line goes with it
+            self._echo(message)
+
+    def _echo(self, message):
         # Print to the real stdout
-        if self.log_as_stdout and  stdout_message.strip() not in self.logger.log_history:
-            self.original_stdout.write(stdout_message)
-        else:
-            self.original_stdout.write(message)
-            
-        self.original_stdout.flush()
+        self.original_stdout.write(message)
+        now = time.monotonic()
+        if now - self._flushed >= self.flush_interval:
+            self._flushed = now
+            self.original_stdout.flush()
 
     def flush(self):
+        self._flushed = time.monotonic()
         self.original_stdout.flush()
 
     def getvalue(self):
         out = self.buffer
         self.buffer = []
-        return out
\ No newline at end of file
+        return out
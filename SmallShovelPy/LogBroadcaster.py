@@ -0,0 +1,174 @@
+import time
+import uuid
+import socket
+import atexit
+import threading
+from collections import OrderedDict
+
+
+MAGIC = b"SSLOG"
+# Room for the "SSLOG <sender> <seq> <part> <parts>\n" header in every datagram
+HEADER_BUDGET = 64
+
+
+class DatagramAssembler:
+    """
+    Listener side of LogBroadcaster: turns received datagrams back into log text,
+    putting fragmented messages back together. Datagrams without a header (older
+    clients) are passed through as they are.
+    """
+    def __init__(self, max_incomplete=256):
+        self.max_incomplete = max_incomplete
+        self._fragments = OrderedDict()
+
+    def feed(self, data, addr=None):
+        '''
+        Returns the log text completed by this datagram, or None.
+        '''
+        if not data.startswith(MAGIC + b" "):
+            return data.decode("utf-8", "replace")
+
+        header, _, payload = data.partition(b"\n")
+        try:
+            _, sender, seq, part, parts = header.split()
+            part, parts = int(part), int(parts)
+        except ValueError:
+            return data.decode("utf-8", "replace")
+
+        if parts == 1:
+            return payload.decode("utf-8", "replace")
+
+        key = (addr, sender, seq)
+        fragments = self._fragments.setdefault(key, {})
+        fragments[part] = payload
+        if len(fragments) < parts:
+            # Fragments lost on the way are never completed, forget the oldest ones
+            while len(self._fragments) > self.max_incomplete:
+                self._fragments.popitem(last=False)
+            return None
+
+        del self._fragments[key]
+        return b"".join(fragments[n] for n in range(parts)).decode("utf-8", "replace")
+
+
+class LogBroadcaster:
+    """
+    Broadcasts log lines over UDP from one long-lived socket. Lines are packed into
+    datagrams of up to `max_datagram` bytes and sent when a datagram is full or
+    every `flush_interval` seconds. Longer lines are split into numbered fragments
+    that DatagramAssembler puts back together. Above `max_lines_per_second` lines
+    are dropped, and a summary of how many were dropped is sent once lines flow again.
+    """
+    def __init__(self, port, max_datagram=1400, flush_interval=0.05, max_lines_per_second=None):
+        self.port = port
+        self.max_datagram = max_datagram
+        self.flush_interval = flush_interval
+        self.max_lines_per_second = max_lines_per_second
+        self.sender = uuid.uuid4().hex[:8]
+        self.seq = 0
+        self.datagrams = 0
+        self.dropped = 0
+        self.errors = 0
+        self._pending = []
+        self._pending_bytes = 0
+        self._tokens = max_lines_per_second
+        self._refilled = time.monotonic()
+        self._lock = threading.Lock()
+        self._socket = None
+        self._flusher = None
+        self._closed = threading.Event()
+        atexit.register(self.close)
+
+    def _allow(self):
+        if self.max_lines_per_second is None:
+            return True
+        now = time.monotonic()
+        self._tokens = min(self.max_lines_per_second, self._tokens + (now - self._refilled) * self.max_lines_per_second)
+        self._refilled = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    def send(self, line):
+        with self._lock:
+            if not self._allow():
+                self.dropped += 1
+                return
+            if self.dropped:
+                self._add(f"... {self.dropped} log lines dropped by the broadcast rate limit ...")
+                self.dropped = 0
+            self._add(line)
+            if self._closed.is_set():
+                # No flusher after close, late lines go out straight away
+                self._send_pending()
+
+        if self._flusher is None and not self._closed.is_set():
+            self._start_flusher()
+
+    def _start_flusher(self):
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_periodically, name="LogBroadcaster", daemon=True)
+                self._flusher.start()
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+
+    def _add(self, line):
+        data = line.encode("utf-8", "replace")
+        budget = self.max_datagram - HEADER_BUDGET
+
+        if len(data) > budget:
+            self._send_pending()
+            parts = -(-len(data) // budget)
+            for part in range(parts):
+                self._send(data[part * budget:(part + 1) * budget], part, parts)
+            self.seq += 1
+            return
+
+        if self._pending and self._pending_bytes + 1 + len(data) > budget:
+            self._send_pending()
+        self._pending.append(data)
+        self._pending_bytes += len(data) + (1 if len(self._pending) > 1 else 0)
+
+    def _send_pending(self):
+        if not self._pending:
+            return
+        self._send(b"\n".join(self._pending), 0, 1)
+        self.seq += 1
+        self._pending = []
+        self._pending_bytes = 0
+
+    def _send(self, payload, part, parts):
+        if self._socket is None:
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        header = b"%s %s %d %d %d\n" % (MAGIC, self.sender.encode(), self.seq, part, parts)
+        try:
+            self._socket.sendto(header + payload, ('<broadcast>', self.port))
+            self.datagrams += 1
+        except OSError:
+            # Nobody may be listening or the network may be down, logging carries on regardless
+            self.errors += 1
+
+    def flush(self):
+        with self._lock:
+            self._send_pending()
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        with self._lock:
+            if self.dropped:
+                self._add(f"... {self.dropped} log lines dropped by the broadcast rate limit ...")
+                self.dropped = 0
+            self._send_pending()
+            if self._socket is not None:
+                self._socket.close()
+                self._socket = None
+
+    def __repr__(self):
+        return f"LogBroadcaster(port={self.port}, datagrams={self.datagrams}, dropped={self.dropped})"
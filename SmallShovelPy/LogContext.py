@@ -0,0 +1,34 @@
+import contextvars
+
+
+_fields = contextvars.ContextVar("smallshovel_log_context", default={})
+
+
+class LogContext:
+    """
+    Fields attached to every structured log record written in this context: the
+    client, pipeline, run ID and task index. Used as a context manager; nested
+    contexts add to or override the outer fields.
+    """
+    FIELDS = ("client", "pipeline", "run_id", "task")
+
+    def __init__(self, **fields):
+        unknown = set(fields) - set(self.FIELDS)
+        if unknown:
+            raise ValueError(f"Unsupported log context fields: {sorted(unknown)}. Supported fields are: {list(self.FIELDS)}")
+        self.fields = fields
+        self._token = None
+
+    def __enter__(self):
+        self._token = _fields.set({**_fields.get(), **self.fields})
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _fields.reset(self._token)
+
+    @staticmethod
+    def current():
+        return _fields.get()
+
+    def __repr__(self):
+        return f"LogContext({', '.join(f'{key}={value}' for key, value in self.fields.items())})"
@@ -0,0 +1,38 @@
+import hashlib
+from collections import OrderedDict
+
+
+class LogHistory:
+    """
+    Messages already written during the current captured call, used to skip duplicates.
+    Keeps fixed-size fingerprints of the last `max_entries` messages instead of the
+    messages themselves, so lookups are O(1) and memory stays bounded.
+    """
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self._fingerprints = OrderedDict()
+
+    @staticmethod
+    def _fingerprint(message):
+        return hashlib.blake2b(message.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+    def append(self, message):
+        fingerprint = self._fingerprint(message)
+        self._fingerprints[fingerprint] = None
+        self._fingerprints.move_to_end(fingerprint)
+        if len(self._fingerprints) > self.max_entries:
+            self._fingerprints.popitem(last=False)
+
+    def __contains__(self, message):
+        if not isinstance(message, str):
+            return False
+        return self._fingerprint(message) in self._fingerprints
+
+    def clear(self):
+        self._fingerprints.clear()
+
+    def __len__(self):
+        return len(self._fingerprints)
+
+    def __repr__(self):
+        return f"LogHistory(entries={len(self)}, max_entries={self.max_entries})"
@@ -0,0 +1,138 @@
+import os
+import re
+import gzip
+import json
+import time
+import atexit
+import threading
+
+
+class LogIndex:
+    """
+    Sidecar index of a structured log file. For every (pipeline, run_id) it keeps the
+    time range and the byte range its records occupy, as JSON lines in `<log>.idx`.
+    Later lines for the same run replace earlier ones. When the log is rotated the
+    index moves along with the segment.
+    """
+    def __init__(self, filename, flush_interval=1.0):
+        self.filename = filename
+        self.path = f"{filename}.idx"
+        self.flush_interval = flush_interval
+        self._spans = {}
+        self._dirty = set()
+        self._flushed = time.monotonic()
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def add(self, pipeline, run_id, timestamp, offset, length):
+        '''
+        Records that a record of `pipeline`/`run_id` was written at `offset`.
+        '''
+        if pipeline is None and run_id is None:
+            return
+
+        key = (pipeline, run_id)
+        with self._lock:
+            span = self._spans.get(key)
+            if span is None:
+                self._spans[key] = {
+                    "pipeline": pipeline,
+                    "run_id": run_id,
+                    "start": timestamp,
+                    "end": timestamp,
+                    "offset": offset,
+                    "end_offset": offset + length,
+                }
+            else:
+                span["end"] = timestamp
+                span["end_offset"] = offset + length
+            self._dirty.add(key)
+            due = time.monotonic() - self._flushed >= self.flush_interval
+
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            self._flushed = time.monotonic()
+            if not self._dirty:
+                return
+            lines = "".join(json.dumps(self._spans[key]) + "\n" for key in self._dirty)
+            self._dirty.clear()
+            with open(self.path, "a") as file:
+                file.write(lines)
+
+    def rotated(self, segment):
+        '''
+        Called once the log file has been moved to `segment`: the index follows it and
+        offsets start over for the new file.
+        '''
+        self.flush()
+        with self._lock:
+            if os.path.isfile(self.path):
+                os.replace(self.path, f"{segment}.idx")
+            self._spans.clear()
+
+    @staticmethod
+    def load(path):
+        '''
+        Returns the spans stored in one index file.
+        '''
+        spans = {}
+        with open(path, "r") as file:
+            for line in file:
+                try:
+                    span = json.loads(line)
+                except ValueError:
+                    continue  # A line cut short by a crash
+                spans[(span["pipeline"], span["run_id"])] = span
+        return list(spans.values())
+
+    @staticmethod
+    def find(filename, pipeline, run_id=None):
+        '''
+        Returns (log path, span) pairs for `pipeline` (and `run_id`) across the rotated
+        segments and the active log, oldest first. Only index files are read.
+        '''
+        base = filename[:-len(".log")] if filename.endswith(".log") else filename
+        directory = os.path.dirname(base) or "."
+        pattern = re.compile(re.escape(os.path.basename(base)) + r"\.\d{8}-\d{6}-\d{6}\.log\.idx$")
+
+        indexes = [os.path.join(directory, name) for name in sorted(os.listdir(directory)) if pattern.match(name)]
+        indexes.append(f"{filename}.idx")
+
+        found = []
+        for index in indexes:
+            log = index[:-len(".idx")]
+            if not os.path.isfile(log) and os.path.isfile(f"{log}.gz"):
+                log = f"{log}.gz"
+            if not os.path.isfile(index) or not os.path.isfile(log):
+                continue
+            for span in LogIndex.load(index):
+                if span["pipeline"] == pipeline and (run_id is None or span["run_id"] == run_id):
+                    found.append((log, span))
+        return found
+
+    @staticmethod
+    def read(filename, pipeline, run_id=None):
+        '''
+        Yields the records of `pipeline` (and `run_id`) by seeking to the byte ranges
+        in the index instead of scanning the whole log.
+        '''
+        for log, span in LogIndex.find(filename, pipeline, run_id):
+            opener = gzip.open if log.endswith(".gz") else open
+            with opener(log, "rb") as file:
+                file.seek(span["offset"])
+                data = file.read(span["end_offset"] - span["offset"])
+
+            # Other runs may have written in between, so the range is filtered as well
+            for line in data.splitlines():
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("pipeline") == pipeline and record.get("run_id") == span["run_id"]:
+                    yield record
+
+    def __repr__(self):
+        return f"LogIndex(path={self.path}, runs={len(self._spans)})"
@@ -0,0 +1,184 @@
+import os
+import re
+import gzip
+import json
+import shutil
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+try:
+    from SmallShovelPy.LogWriter import write_batch
+except ModuleNotFoundError:
+    try:
+        from LogWriter import write_batch
+    except ImportError as e:
+        raise ImportError(f"Could not import LogWriter: {e}")
+
+
+SEGMENT_TIME_FORMAT = "%Y%m%d-%H%M%S-%f"
+
+
+class LogRotator:
+    """
+    Rotates a log file once it reaches `max_bytes` or is `interval` seconds old.
+    The full file is renamed to `<name>.<timestamp>.log`, gzipped on a background
+    thread, and described by a `<name>.<timestamp>.index.json` sidecar holding its
+    time range. Only the newest `backup_count` segments are kept. A LogIndex set as
+    `index` moves along with each segment.
+    """
+    def __init__(self, filename, max_bytes=None, interval=None, backup_count=5, compress=True):
+        if max_bytes is None and interval is None:
+            raise ValueError("LogRotator needs max_bytes, interval or both.")
+
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.backup_count = backup_count
+        self.compress = compress
+        self.base = filename[:-len(".log")] if filename.endswith(".log") else filename
+        self.index = None
+        self.lock = threading.RLock()
+        self._compressor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="LogRotator")
+
+        self.size = 0
+        self.start = None
+        self.end = None
+        if os.path.isfile(filename) and os.path.getsize(filename):
+            self.size = os.path.getsize(filename)
+            self.start = self._first_timestamp(filename)
+            self.end = datetime.fromtimestamp(os.path.getmtime(filename))
+
+    @staticmethod
+    def _first_timestamp(filename):
+        # Text log lines start with str(datetime.now()); fall back to the file time otherwise
+        with open(filename, "r", errors="replace") as file:
+            head = file.readline()[:26]
+        try:
+            return datetime.fromisoformat(head)
+        except ValueError:
+            return datetime.fromtimestamp(os.path.getmtime(filename))
+
+    def due(self, pending_bytes=0):
+        '''
+        Whether the file should be rotated before writing `pending_bytes` more.
+        '''
+        if self.size == 0:
+            return False
+        if self.max_bytes is not None and self.size + pending_bytes > self.max_bytes:
+            return True
+        if self.interval is not None and self.start is not None:
+            return (datetime.now() - self.start).total_seconds() >= self.interval
+        return False
+
+    def record(self, nbytes):
+        '''
+        Accounts for `nbytes` just written to the active file.
+        '''
+        now = datetime.now()
+        self.size += nbytes
+        self.start = self.start or now
+        self.end = now
+
+    def append(self, items):
+        '''
+        Appends (message, meta) items to the log file, rotating first when due. Used
+        by writers that do not keep the file open.
+        '''
+        with self.lock:
+            if self.due(sum(len(message) for message, _ in items)):
+                self.rotate()
+            with open(self.filename, "ab") as file:
+                self.record(write_batch(file, items, self.index))
+
+    def rotate(self):
+        '''
+        Moves the active file aside as a new segment. The caller must have closed its
+        handle to the file and reopens it afterwards.
+        '''
+        with self.lock:
+            if not os.path.isfile(self.filename):
+                return None
+
+            stamp = (self.start or datetime.now()).strftime(SEGMENT_TIME_FORMAT)
+            segment = f"{self.base}.{stamp}.log"
+            os.replace(self.filename, segment)
+            if self.index is not None:
+                self.index.rotated(segment)
+
+            index = {
+                "file": os.path.basename(segment),
+                "start": (self.start or datetime.now()).isoformat(),
+                "end": (self.end or datetime.now()).isoformat(),
+                "bytes": self.size,
+            }
+            self._write_index(f"{self.base}.{stamp}.index.json", index)
+
+            self.size = 0
+            self.start = None
+            self.end = None
+
+            # Compression and cleanup never run on the thread that writes the log
+            self._compressor.submit(self._finish_segment, segment, stamp, index)
+            return segment
+
+    @staticmethod
+    def _write_index(path, index):
+        with open(f"{path}.tmp", "w") as file:
+            json.dump(index, file)
+        os.replace(f"{path}.tmp", path)
+
+    def _finish_segment(self, segment, stamp, index):
+        if self.compress:
+            with open(segment, "rb") as source, gzip.open(f"{segment}.gz", "wb") as target:
+                shutil.copyfileobj(source, target)
+            os.remove(segment)
+            index = dict(index, file=os.path.basename(f"{segment}.gz"), compressed_bytes=os.path.getsize(f"{segment}.gz"))
+            self._write_index(f"{self.base}.{stamp}.index.json", index)
+        self._prune()
+
+    def _stamps(self):
+        directory = os.path.dirname(self.base) or "."
+        pattern = re.compile(re.escape(os.path.basename(self.base)) + r"\.(\d{8}-\d{6}-\d{6})\.index\.json$")
+        return sorted(match.group(1) for match in map(pattern.match, os.listdir(directory)) if match)
+
+    def _prune(self):
+        if self.backup_count is None:
+            return
+        stamps = self._stamps()
+        for stamp in stamps[:max(0, len(stamps) - self.backup_count)]:
+            for path in (f"{self.base}.{stamp}.log", f"{self.base}.{stamp}.log.gz", f"{self.base}.{stamp}.log.idx", f"{self.base}.{stamp}.index.json"):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def segments(self, start=None, end=None):
+        '''
+        Returns the paths of the segments, oldest first and ending with the active file,
+        whose time range overlaps `start`..`end`. Only the small index files are read.
+        '''
+        paths = []
+        for stamp in self._stamps():
+            try:
+                with open(f"{self.base}.{stamp}.index.json", "r") as file:
+                    index = json.load(file)
+            except (OSError, ValueError):
+                continue
+            if end is not None and datetime.fromisoformat(index["start"]) > end:
+                continue
+            if start is not None and datetime.fromisoformat(index["end"]) < start:
+                continue
+            paths.append(os.path.join(os.path.dirname(self.base), index["file"]))
+
+        if os.path.isfile(self.filename) and (end is None or self.start is None or self.start <= end):
+            paths.append(self.filename)
+        return paths
+
+    def wait(self):
+        '''
+        Blocks until segments rotated so far are compressed and pruned.
+        '''
+        self._compressor.submit(lambda: None).result()
+
+    def __repr__(self):
+        return f"LogRotator(filename={self.filename}, max_bytes={self.max_bytes}, interval={self.interval}, backup_count={self.backup_count})"
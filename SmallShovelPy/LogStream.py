@@ -0,0 +1,167 @@
+import json
+import time
+import socket
+import struct
+import threading
+from itertools import islice
+from collections import deque
+
+
+# Every frame is a 4 byte big-endian length followed by that many bytes of JSON
+FRAME_HEADER = struct.Struct("!I")
+
+
+def recv_exactly(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return bytes(data)
+
+
+class LogStream:
+    """
+    Ring buffer of the last `capacity` log lines, served to TCP subscribers. A
+    subscriber sends one JSON line, {"last": N} or {"since": <unix time>}, and gets
+    the matching buffered lines followed by every new line as length-prefixed JSON
+    frames. Each subscriber has its own cursor and thread, so a slow one only holds
+    up itself. If it falls further behind than the buffer holds, it gets a
+    {"dropped": n} frame for the lines it missed.
+    """
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self.seq = 0
+        self.subscribers = 0
+        self._records = deque(maxlen=capacity)
+        self._condition = threading.Condition()
+        self._server = None
+        self._closed = threading.Event()
+
+    def append(self, line):
+        with self._condition:
+            self.seq += 1
+            self._records.append((self.seq, time.time(), line))
+            self._condition.notify_all()
+
+    def _cursor(self, request):
+        '''
+        Returns the sequence number after which a new subscriber starts.
+        '''
+        if "since" in request:
+            for seq, created, _ in self._records:
+                if created >= request["since"]:
+                    return seq - 1
+            return self.seq
+        if "last" in request:
+            return max(0, self.seq - int(request["last"]))
+        return self.seq
+
+    def _after(self, cursor):
+        '''
+        Returns how many lines after `cursor` are no longer buffered, and the ones that are.
+        '''
+        oldest = self.seq - len(self._records) + 1
+        dropped = max(0, oldest - cursor - 1)
+        return dropped, list(islice(self._records, max(0, cursor + 1 - oldest), None))
+
+    def serve(self, port, host='127.0.0.1'):
+        '''
+        Starts accepting subscribers on `port` in a background thread.
+        '''
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind((host, port))
+        self._server.listen()
+        threading.Thread(target=self._accept, name="LogStream", daemon=True).start()
+
+    def _accept(self):
+        while not self._closed.is_set():
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                break  # Server socket closed
+            threading.Thread(target=self._serve_subscriber, args=(conn,), daemon=True).start()
+
+    def _serve_subscriber(self, conn):
+        with conn:
+            try:
+                conn.settimeout(5)
+                request = json.loads(conn.makefile("rb").readline(1024) or b"{}")
+                conn.settimeout(None)
+                with self._condition:
+                    cursor = self._cursor(request)
+                    self.subscribers += 1
+            except (OSError, ValueError, TypeError) as e:
+                self._send(conn, [{"error": f"Invalid subscription request: {e}"}])
+                return
+
+            try:
+                while not self._closed.is_set():
+                    with self._condition:
+                        while self.seq <= cursor and not self._closed.is_set():
+                            self._condition.wait(1.0)
+                        dropped, records = self._after(cursor)
+                        cursor = self.seq
+
+                    frames = [{"dropped": dropped}] if dropped else []
+                    frames += [{"seq": seq, "time": created, "line": line} for seq, created, line in records]
+                    # Blocks while the subscriber is not reading, the buffer moves on without it
+                    if frames and not self._send(conn, frames):
+                        break
+            finally:
+                with self._condition:
+                    self.subscribers -= 1
+
+    @staticmethod
+    def _send(conn, frames):
+        data = []
+        for frame in frames:
+            payload = json.dumps(frame).encode("utf-8")
+            data.append(FRAME_HEADER.pack(len(payload)) + payload)
+        try:
+            conn.sendall(b"".join(data))
+            return True
+        except OSError:
+            return False
+
+    @staticmethod
+    def subscribe(host, port, last=None, since=None):
+        '''
+        Connects to a LogStream and yields its frames as dicts: {"seq", "time", "line"}
+        for log lines and {"dropped": n} when lines were missed. Without `last` or
+        `since` only new lines are sent.
+        '''
+        request = {}
+        if last is not None:
+            request["last"] = last
+        if since is not None:
+            request["since"] = since
+
+        with socket.create_connection((host, port)) as sock:
+            sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+            while True:
+                header = recv_exactly(sock, FRAME_HEADER.size)
+                if header is None:
+                    return
+                payload = recv_exactly(sock, FRAME_HEADER.unpack(header)[0])
+                if payload is None:
+                    return
+                yield json.loads(payload)
+
+    def close(self):
+        self._closed.set()
+        with self._condition:
+            self._condition.notify_all()
+        if self._server is not None:
+            try:
+                # Wakes the accept() blocking in the server thread
+                self._server.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._server.close()
+            self._server = None
+
+    def __repr__(self):
+        return f"LogStream(capacity={self.capacity}, seq={self.seq}, subscribers={self.subscribers})"
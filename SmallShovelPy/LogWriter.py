@@ -0,0 +1,178 @@
+import sys
+import time
+import queue
+import atexit
+import threading
+
+
+_CLOSE = object()
+
+
+def write_batch(file, items, index=None):
+    '''
+    Writes (message, meta) items to a log file opened in binary append mode and
+    returns the number of bytes written. Items with meta, a (pipeline, run_id, time)
+    tuple, are recorded in `index` at the byte offset they were written to.
+    '''
+    pieces = [message.encode("utf-8", "replace") for message, _ in items]
+    offset = file.tell()
+    file.write(b"".join(pieces))
+
+    written = 0
+    for (_, meta), piece in zip(items, pieces):
+        if meta is not None and index is not None:
+            index.add(*meta, offset + written, len(piece))
+        written += len(piece)
+    return written
+
+
+class LogWriter:
+    """
+    Background writer for a log file. Messages are queued and written in batches by a
+    dedicated thread that keeps the file open, so callers never wait on disk I/O.
+    A batch is written once `flush_size` messages are waiting or `flush_interval`
+    seconds have passed. With a LogRotator, rotation also happens on that thread.
+    A batch that cannot be written (e.g. a full disk) is retried synchronously once
+    and otherwise dropped and counted in `dropped`, so logging never stalls callers.
+    """
+    def __init__(self, filename, flush_interval=0.5, flush_size=256, max_queue=100000, rotator=None, index=None):
+        self.filename = filename
+        self.rotator = rotator
+        self.index = index
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self._failing = False
+        self.errors = 0
+        self.dropped = 0
+        atexit.register(self.close)
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="LogWriter", daemon=True)
+                self._thread.start()
+
+    def write(self, message, meta=None):
+        if self._closed or (self._thread is not None and not self._thread.is_alive()):
+            # Late messages after shutdown still reach the file, just synchronously
+            self._append([(message, meta)])
+            return
+        if self._thread is None:
+            self._start()
+        # A full queue blocks the caller, so a stalled disk slows logging instead of eating memory
+        self._queue.put((message, meta))
+
+    def _append(self, items):
+        if self.rotator is not None:
+            self.rotator.append(items)
+        else:
+            with open(self.filename, "ab") as file:
+                write_batch(file, items, self.index)
+
+    def _write(self, file, batch):
+        '''
+        Writes one batch to `file`, opening or rotating it as needed, and returns the
+        file to use for the next batch.
+        '''
+        if file is None:
+            file = open(self.filename, "ab")
+        if self.rotator is not None and self.rotator.due(sum(len(message) for message, _ in batch)):
+            file.close()
+            file = None
+            self.rotator.rotate()
+            file = open(self.filename, "ab")
+        written = write_batch(file, batch, self.index)
+        file.flush()
+        if self.rotator is not None:
+            self.rotator.record(written)
+        if self.index is not None:
+            self.index.flush()
+        return file
+
+    def _failed(self, batch, error):
+        self.errors += 1
+        try:
+            self._append(batch)
+        except Exception:
+            self.dropped += len(batch)
+            if not self._failing:
+                print(f"LogWriter could not write to {self.filename}, dropping log lines until it can: {error}", file=sys.__stderr__)
+            self._failing = True
+            return
+        self._failing = False
+
+    def _run(self):
+        file = None
+        try:
+            batch = []
+            deadline = None
+            closing = False
+            while not closing:
+                # Idle until the first message, then give the batch up to flush_interval to fill
+                timeout = None if not batch else max(0.0, deadline - time.monotonic())
+                try:
+                    item = self._queue.get(timeout=timeout)
+                    if item is _CLOSE:
+                        closing = True
+                    else:
+                        batch.append(item)
+                        if len(batch) == 1:
+                            deadline = time.monotonic() + self.flush_interval
+                except queue.Empty:
+                    pass
+
+                if batch and (closing or len(batch) >= self.flush_size or time.monotonic() >= deadline):
+                    try:
+                        file = self._write(file, batch)
+                        self._failing = False
+                    except Exception as e:
+                        if file is not None:
+                            try:
+                                file.close()
+                            except OSError:
+                                pass
+                        file = None  # Reopened for the next batch
+                        self._failed(batch, e)
+                    finally:
+                        for _ in batch:
+                            self._queue.task_done()
+                        batch = []
+            self._queue.task_done()
+        finally:
+            if file is not None:
+                file.close()
+
+    def flush(self):
+        '''
+        Blocks until every message queued so far is written to the file.
+        '''
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.join()
+
+    def close(self):
+        '''
+        Writes out everything still queued and stops the writer thread.
+        '''
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_CLOSE)
+            self._thread.join()
+
+        # Anything that raced in behind the close marker
+        late = []
+        while True:
+            try:
+                late.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if late:
+            self._append(late)
+
+    def __repr__(self):
+        return f"LogWriter(filename={self.filename}, queued={self._queue.qsize()})"
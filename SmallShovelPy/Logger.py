@@ -1,7 +1,11 @@
-import sys
+import re
+import json
+import random
+import asyncio
 import functools
+import threading
+import contextvars
 from datetime import datetime
-import socket
 
 try:
     from SmallShovelPy.DualOutput import DualOutput
@@ -10,78 +14,323 @@ except ModuleNotFoundError:
         from DualOutput import DualOutput
     except ImportError as e:
         raise ImportError(f"Could not import Pipeline or Logger: {e}")
+try:
+    from SmallShovelPy.LogWriter import LogWriter
+except ModuleNotFoundError:
+    try:
+        from LogWriter import LogWriter
+    except ImportError as e:
+        raise ImportError(f"Could not import LogWriter: {e}")
+try:
+    from SmallShovelPy.LogHistory import LogHistory
+except ModuleNotFoundError:
+    try:
+        from LogHistory import LogHistory
+    except ImportError as e:
+        raise ImportError(f"Could not import LogHistory: {e}")
+try:
+    from SmallShovelPy.LogRotator import LogRotator
+except ModuleNotFoundError:
+    try:
+        from LogRotator import LogRotator
+    except ImportError as e:
+        raise ImportError(f"Could not import LogRotator: {e}")
+try:
+    from SmallShovelPy.LogBroadcaster import LogBroadcaster
+except ModuleNotFoundError:
+    try:
+        from LogBroadcaster import LogBroadcaster
+    except ImportError as e:
+        raise ImportError(f"Could not import LogBroadcaster: {e}")
+try:
+    from SmallShovelPy.LogStream import LogStream
+except ModuleNotFoundError:
+    try:
+        from LogStream import LogStream
+    except ImportError as e:
+        raise ImportError(f"Could not import LogStream: {e}")
+try:
+    from SmallShovelPy.StdoutProxy import StdoutProxy
+except ModuleNotFoundError:
+    try:
+        from StdoutProxy import StdoutProxy
+    except ImportError as e:
+        raise ImportError(f"Could not import StdoutProxy: {e}")
+try:
+    from SmallShovelPy.LogContext import LogContext
+except ModuleNotFoundError:
+    try:
+        from LogContext import LogContext
+    except ImportError as e:
+        raise ImportError(f"Could not import LogContext: {e}")
+try:
+    from SmallShovelPy.LogIndex import LogIndex
+except ModuleNotFoundError:
+    try:
+        from LogIndex import LogIndex
+    except ImportError as e:
+        raise ImportError(f"Could not import LogIndex: {e}")
+try:
+    from SmallShovelPy.LogWriter import write_batch
+except ModuleNotFoundError:
+    try:
+        from LogWriter import write_batch
+    except ImportError as e:
+        raise ImportError(f"Could not import LogWriter: {e}")
+
+# "<time> - INFO  - <indent><message>", the text form of every log line
+LINE_PATTERN = re.compile(r"^(\d{4}-\d\d-\d\d[ T][\d:.]+) - (\w+)\s+- (.*?)\n?$", re.S)
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARN": 30, "ERROR": 40}
+
+
+def _owner():
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None  # No event loop running in this thread
+    return threading.get_ident(), id(task)
+
+
+class _CaptureState:
+    """
+    Call stack, pending lines and dedupe history of the captured calls running in one
+    thread or asyncio task.
+    """
+    def __init__(self, call_stack, history_size):
+        self.owner = _owner()
+        self.call_stack = call_stack
+        self.buffer = []
+        self.log_history = LogHistory(history_size)
 
 
 class Logger:
     """
     Logger for capturing and formatting function output.
+
+    With `async_write=True` log lines are handed to a background LogWriter that keeps
+    the file open and writes every `flush_interval` seconds or `flush_size` lines.
+    Duplicate lines are detected against the last `history_size` lines written.
+    Setting `max_bytes` and/or `rotate_interval` (seconds) rotates the log file,
+    keeping `backup_count` gzipped segments (see LogRotator).
+    Broadcast lines are batched into datagrams by a LogBroadcaster and limited to
+    `broadcast_rate_limit` lines per second when set.
+    Output is captured per thread and asyncio task through a StdoutProxy, so
+    concurrently running pipelines are logged separately.
+    With `structured=True` the file holds one JSON record per line with the time,
+    level, call depth and the LogContext fields, and a LogIndex sidecar maps every
+    pipeline run to its byte range (see LogIndex.read).
+    Captured lines below `min_level` (DEBUG, INFO, WARN or ERROR) are dropped; the
+    default keeps everything. `sample_rates` keeps only a fraction of the non-error
+    lines of a pipeline, e.g. {"P1": 0.1}. Both are checked before a line is formatted.
+    With `stream_capacity` the last that many lines are also kept in a LogStream,
+    which can serve them to TCP subscribers (see LogStream.serve).
     """
-    def __init__(self, filename, log_as_stdout=False, broadcast_logs=True, port=6000):
+    def __init__(self, filename, log_as_stdout=False, broadcast_logs=True, port=6000, async_write=False, flush_interval=0.5, flush_size=256, history_size=100000,
+                 max_bytes=None, rotate_interval=None, backup_count=5, compress_logs=True, broadcast_rate_limit=None,
+                 structured=False, client=None, min_level="DEBUG", sample_rates=None,
+                 stream_capacity=None):
         if filename.endswith('.log'):
             self.filename = filename
         else:
             self.filename = f"{filename}.log"
-        self.buffer = []
-        self.call_stack = []
+        self.history_size = history_size
+        self._capture = contextvars.ContextVar(f"smallshovel_capture_{id(self)}", default=None)
         self.log_as_stdout = log_as_stdout
         self.broadcast_logs = broadcast_logs
-        self.port = port
-        self.log_history = []
+        self.broadcaster = LogBroadcaster(port, max_lines_per_second=broadcast_rate_limit)
+        self.rotator = None
+        if max_bytes is not None or rotate_interval is not None:
+            self.rotator = LogRotator(self.filename, max_bytes, rotate_interval, backup_count, compress_logs)
+        self.writer = LogWriter(self.filename, flush_interval, flush_size, rotator=self.rotator) if async_write else None
+        self.stream = LogStream(stream_capacity) if stream_capacity is not None else None
+        self.client = client
+        self.index = None
+        self._write_lock = threading.Lock()
+        self.structured = structured
+        self.min_level = min_level
+        self.sample_rates = sample_rates or {}
+
+    @property
+    def min_level(self):
+        return self._min_level
+
+    @min_level.setter
+    def min_level(self, level):
+        if level not in LEVELS:
+            raise ValueError(f"Unsupported log level: {level}. Supported levels are: {list(LEVELS)}")
+        self._min_level = level
+        self._min_rank = LEVELS[level]
+
+    def accepts(self, level, context=None):
+        '''
+        Whether a captured line of `level` is logged, given the minimum level and the
+        sample rate of the pipeline in `context` (the current LogContext by default).
+        '''
+        if LEVELS[level] < self._min_rank:
+            return False
+        if self.sample_rates and level != "ERROR":
+            context = LogContext.current() if context is None else context
+            rate = self.sample_rates.get(context.get("pipeline"))
+            if rate is not None and random.random() >= rate:
+                return False
+        return True
+
+    @property
+    def structured(self):
+        return self.index is not None
 
-    def write(self, message):
+    @structured.setter
+    def structured(self, structured):
+        # Can be switched on after construction, e.g. for the Client's module logger
+        if structured and self.index is None:
+            self.index = LogIndex(self.filename)
+        elif not structured and self.index is not None:
+            self.index.flush()
+            self.index = None
+        if self.rotator is not None:
+            self.rotator.index = self.index
+        if self.writer is not None:
+            self.writer.index = self.index
+
+    def _state(self):
+        '''
+        Returns the capture state of the calling thread or task. Work started from a
+        captured call (e.g. a pipeline task on a thread pool) inherits the call depth
+        but gets its own buffer and history.
+        '''
+        state = self._capture.get()
+        if state is None or state.owner != _owner():
+            state = _CaptureState(list(state.call_stack) if state else [], self.history_size)
+            self._capture.set(state)
+        return state
+
+    @property
+    def call_stack(self):
+        return self._state().call_stack
+
+    @property
+    def buffer(self):
+        return self._state().buffer
+
+    @property
+    def log_history(self):
+        return self._state().log_history
+
+    def _record(self, message, context=None):
+        '''
+        Turns a text log line into a JSON record line and its index key
+        (pipeline, run_id, time). `context` defaults to the current LogContext.
+        '''
+        match = LINE_PATTERN.match(message)
+        if match:
+            timestamp, level, text = match.groups()
+        else:
+            timestamp, level, text = f"{datetime.now()}", "INFO", message.rstrip("\n")
+
+        context = LogContext.current() if context is None else context
+        record = {
+            "time": timestamp,
+            "level": level,
+            "client": context.get("client", self.client),
+            "pipeline": context.get("pipeline"),
+            "run_id": context.get("run_id"),
+            "task": context.get("task"),
+            "depth": (len(text) - len(text.lstrip(" "))) // 4,
+            "message": text.strip(),
+        }
+        return json.dumps(record, default=str) + "\n", (record["pipeline"], record["run_id"], timestamp)
+
+    def write(self, message, context=None):
 
         if not message.endswith('\n'):
             message = message + "\n"
 
-        file = open(self.filename, "a+")
-        file.write(message)
-        file.close()
+        line, meta = self._record(message, context) if self.index is not None else (message, None)
+
+        if self.writer is not None:
+            self.writer.write(line, meta)
+        else:
+            with self._write_lock:
+                if self.rotator is not None:
+                    self.rotator.append([(line, meta)])
+                else:
+                    with open(self.filename, "ab") as file:
+                        write_batch(file, [(line, meta)], self.index)
 
         if self.broadcast_logs:
             self.broadcast_message(message.strip('\n'))
+
+        if self.stream is not None:
+            self.stream.append(message.strip('\n'))
         
         self.log_history.append(message)
 
 
-    def broadcast_message(self, message):
-        # Set up the broadcast socket
-        server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+    def flush(self):
+        '''
+        Waits until every line written so far has reached the log file.
+        '''
+        if self.writer is not None:
+            self.writer.flush()
+        if self.index is not None:
+            self.index.flush()
 
-        broadcast_address = ('<broadcast>', self.port)
+    def close(self):
+        self.broadcaster.close()
+        if self.stream is not None:
+            self.stream.close()
+        if self.writer is not None:
+            self.writer.close()
+        if self.index is not None:
+            self.index.flush()
 
-        server_socket.sendto(message.encode(), broadcast_address)
-        server_socket.close()
+    @property
+    def port(self):
+        return self.broadcaster.port
+
+    @port.setter
+    def port(self, port):
+        # Client moves the broadcast port once it knows its own control port
+        self.broadcaster.flush()
+        self.broadcaster.port = port
+
+    def broadcast_message(self, message):
+        self.broadcaster.send(message)
 
 
     def capture_output(self, func):
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            self.call_stack.append(func.__name__)
-            indent_level = len(self.call_stack) - 1
-
-            # Log the function call
-            args_str = ', '.join(map(str, args))
-            kwargs_str = ', '.join(f"{k}={v}" for k, v in kwargs.items())
-            header = {
-                "Time": f"{datetime.now()}",
-                "Message": f"{'    ' * indent_level}{func.__name__}: Args({args_str}), kwargs({kwargs_str})",
-                "Level": " - INFO  - ",
-            }
-            if header in self.buffer:
-                self.buffer.remove(header)
-            if header not in self.buffer:
-                self.buffer.append(header)
+            state = self._state()
+            state.call_stack.append(func.__name__)
+            indent_level = len(state.call_stack) - 1
+
+            # Log the function call, unless INFO lines are filtered out anyway
+            if LEVELS["INFO"] >= self._min_rank:
+                args_str = ', '.join(map(str, args))
+                kwargs_str = ', '.join(f"{k}={v}" for k, v in kwargs.items())
+                header = {
+                    "Time": f"{datetime.now()}",
+                    "Message": f"{'    ' * indent_level}{func.__name__}: Args({args_str}), kwargs({kwargs_str})",
+                    "Level": " - INFO  - ",
+                    "Context": LogContext.current(),
+                }
+                if header in state.buffer:
+                    state.buffer.remove(header)
+                if header not in state.buffer:
+                    state.buffer.append(header)
 
+            # Only this thread or task writes to dual_output, whatever others print meanwhile
+            proxy = StdoutProxy.install()
             dual_output = DualOutput(
                 capture_prefix="    " * (indent_level+1),
                 stdout_prefix="    " * (indent_level+1),
                 indent_level=indent_level,
                 log_as_stdout=self.log_as_stdout,
-                logger=self
+                logger=self,
+                original_stdout=proxy.current()
             )
-            old_stdout = sys.stdout
-            sys.stdout = dual_output
+            token = StdoutProxy.redirect(dual_output)
 
             try:
                 result = func(*args, **kwargs)
@@ -89,25 +338,25 @@ class Logger:
                 print(f"Captured Error: {e}")
                 result = None
             finally:
-                sys.stdout = old_stdout
-                self.call_stack.pop()
+                StdoutProxy.restore(token)
+                state.call_stack.pop()
+                dual_output.flush()
 
             captured_output = dual_output.getvalue()
-            self.buffer += captured_output
+            state.buffer += captured_output
 
             # Write log
-            for line in self.buffer:
-                if line['Message'].strip() + "\n" not in self.log_history:
+            for line in state.buffer:
+                if line['Message'].strip() + "\n" not in state.log_history:
                     log_entry = f"{line['Time']}{line['Level']}{line['Message']}"
-                    self.write(log_entry + "\n")
+                    self.write(log_entry + "\n", line.get('Context'))
                 # self.buffer.remove(line)
 
             # Clear the buffer
-            self.buffer = []
-            if len(self.call_stack) == 0:
-                self.log_history = []
+            state.buffer = []
+            if len(state.call_stack) == 0:
+                state.log_history.clear()
 
             return result
-            self.buffer = []
 
         return wrapper
\ No newline at end of file
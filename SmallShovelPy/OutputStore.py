@@ -0,0 +1,101 @@
+import os
+import pickle
+import tempfile
+try:
+    from SmallShovelPy.DataChannel import DataHandle
+except ModuleNotFoundError:
+    try:
+        from DataChannel import DataHandle
+    except ImportError as e:
+        raise ImportError(f"Could not import DataChannel: {e}")
+
+
+RETAIN_MODES = ('all', 'spill', 'final')
+
+
+class SpilledOutput:
+    """
+    Placeholder for a task output that was written to disk after its last consumer
+    ran. `load()` reads the value back.
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        with open(self.path, "rb") as file:
+            return pickle.load(file)
+
+    def release(self):
+        '''
+        Deletes the spill file. The output cannot be loaded afterwards.
+        '''
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __repr__(self):
+        return f"SpilledOutput({self.path})"
+
+
+class OutputStore:
+    """
+    Reference counts task outputs during a run. Every task that depends on an output,
+    through `depends_on` or an `outputs[n]` reference, holds one reference to it. Once
+    the last one has run, the output is released (`retain='final'`) or written to a
+    temp file and replaced with a SpilledOutput (`retain='spill'`). Outputs nobody
+    consumes are the pipeline's results and always stay in memory.
+    Published DataHandles are released along with them: dropped handles delete their
+    data, spilled ones are read back and spilled like any other output.
+    Every SpilledOutput created is appended to `spilled`, so its owner can delete it.
+    """
+    def __init__(self, deps, retain='all', directory=None, spilled=None):
+        if retain not in RETAIN_MODES:
+            raise ValueError(f"Unsupported retain mode: {retain}. Supported modes are: {list(RETAIN_MODES)}")
+
+        self.deps = deps
+        self.retain = retain
+        self.directory = directory
+        self.spilled = spilled if spilled is not None else []
+        self.refcounts = [0] * len(deps)
+        for upstream in deps:
+            for j in upstream:
+                self.refcounts[j] += 1
+
+    def task_finished(self, i, outputs):
+        '''
+        Drops task `i`'s references to its upstream outputs, whether it succeeded,
+        failed or was loaded from a checkpoint, and releases the outputs no task still needs.
+        '''
+        if self.retain == 'all':
+            return
+
+        for j in self.deps[i]:
+            self.refcounts[j] -= 1
+            if self.refcounts[j] == 0:
+                outputs[j] = self._evict(outputs[j])
+
+    def _evict(self, output):
+        if isinstance(output, DataHandle):
+            handle, output = output, (output.open() if self.retain == 'spill' else None)
+            evicted = self._evict(output)
+            handle.release()
+            return evicted
+
+        if self.retain == 'final' or output is None:
+            return None
+
+        descriptor, path = tempfile.mkstemp(prefix="smallshovel_output_", suffix=".pkl", dir=self.directory)
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                pickle.dump(output, file, protocol=4)
+        except Exception:
+            # Streams, locks and the like cannot be spilled and stay in memory
+            os.remove(path)
+            return output
+        spilled = SpilledOutput(path)
+        self.spilled.append(spilled)
+        return spilled
+
+    def __repr__(self):
+        return f"OutputStore(retain={self.retain}, live={sum(count > 0 for count in self.refcounts)})"
@@ -0,0 +1,112 @@
+import os
+import subprocess
+import tempfile
+import threading
+import contextvars
+from collections import deque
+from datetime import datetime
+try:
+    from SmallShovelPy.RunRecord import wait_with_usage
+except ModuleNotFoundError:
+    try:
+        from RunRecord import wait_with_usage
+    except ImportError as e:
+        raise ImportError(f"Could not import RunRecord: {e}")
+
+
+class OutputStream:
+    """
+    Bounded capture of a subprocess stream. Keeps the first `head` and last `tail`
+    lines in memory, or spills every line to a temp file when `spill=True`.
+    """
+    def __init__(self, head=100, tail=100, spill=False, on_line=None):
+        self.head = head
+        self.on_line = on_line
+        self.head_lines = []
+        self.tail_lines = deque(maxlen=tail)
+        self.line_count = 0
+        self.spill_file = None
+
+        if spill:
+            self.spill_file = tempfile.NamedTemporaryFile(
+                "w", prefix="smallshovel_", suffix=".log", delete=False
+            )
+
+    def feed(self, line):
+        self.line_count += 1
+
+        if self.on_line:
+            self.on_line(line)
+
+        if self.spill_file:
+            self.spill_file.write(line)
+        elif len(self.head_lines) < self.head:
+            self.head_lines.append(line)
+        else:
+            self.tail_lines.append(line)
+
+    def read_from(self, stream, chunk_size=65536):
+        # Bounded readline so a single huge line cannot blow up memory either
+        for line in iter(lambda: stream.readline(chunk_size), ""):
+            self.feed(line)
+        stream.close()
+
+    def getvalue(self):
+        '''
+        Returns the captured head/tail window, or the path of the spill file.
+        '''
+        if self.spill_file:
+            self.spill_file.close()
+            return self.spill_file.name
+
+        omitted = self.line_count - len(self.head_lines) - len(self.tail_lines)
+        lines = list(self.head_lines)
+        if omitted > 0:
+            lines.append(f"... {omitted} lines omitted ...\n")
+        lines += self.tail_lines
+        return "".join(lines)
+
+    def discard(self):
+        if self.spill_file:
+            self.spill_file.close()
+            os.remove(self.spill_file.name)
+
+
+def line_forwarder(logger=None):
+    '''
+    Returns the callback that passes streamed output lines on to `logger`, or prints them.
+    '''
+    if logger is not None:
+        def forward(line):
+            logger.write(f"{datetime.now()} - INFO  - {line}")
+    else:
+        def forward(line):
+            print(line, end="" if line.endswith("\n") else "\n")
+    return forward
+
+
+def stream_subprocess(command, head=100, tail=100, spill=False, logger=None, env=None):
+    '''
+    Runs `command`, reading stdout and stderr line by line as they arrive instead of
+    buffering them whole. Every line is written to `logger` (or printed) immediately.
+    Returns (returncode, stdout, stderr, usage) where the outputs are OutputStream
+    values and usage is the child's resource usage from wait_with_usage.
+    '''
+    forward = line_forwarder(logger)
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, env=env)
+    stdout = OutputStream(head=head, tail=tail, spill=spill, on_line=forward)
+    stderr = OutputStream(head=head, tail=tail, spill=spill, on_line=forward)
+
+    # Two readers so a full stderr pipe can never block the child while we read stdout.
+    # Each runs in a copy of our context so printed lines reach the caller's captured output.
+    readers = [
+        threading.Thread(target=contextvars.copy_context().run, args=(stdout.read_from, process.stdout), daemon=True),
+        threading.Thread(target=contextvars.copy_context().run, args=(stderr.read_from, process.stderr), daemon=True),
+    ]
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join()
+    returncode, usage = wait_with_usage(process)
+
+    return returncode, stdout, stderr, usage
@@ -1,23 +1,419 @@
 import os
 import subprocess
 import re
+import shlex
+import time
+import uuid
+import asyncio
+import inspect
+import contextvars
+import datetime
+from itertools import islice
+from collections.abc import Iterator
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+try:
+    from SmallShovelPy.OutputStream import OutputStream, stream_subprocess, line_forwarder
+except ModuleNotFoundError:
+    try:
+        from OutputStream import OutputStream, stream_subprocess, line_forwarder
+    except ImportError as e:
+        raise ImportError(f"Could not import OutputStream: {e}")
+try:
+    from SmallShovelPy.TaskCache import TaskCache
+except ModuleNotFoundError:
+    try:
+        from TaskCache import TaskCache
+    except ImportError as e:
+        raise ImportError(f"Could not import TaskCache: {e}")
+try:
+    from SmallShovelPy.BatchStream import BatchStream
+except ModuleNotFoundError:
+    try:
+        from BatchStream import BatchStream
+    except ImportError as e:
+        raise ImportError(f"Could not import BatchStream: {e}")
+try:
+    from SmallShovelPy.DataChannel import DataChannel, DataHandle, URI_PREFIX, task_environment
+except ModuleNotFoundError:
+    try:
+        from DataChannel import DataChannel, DataHandle, URI_PREFIX, task_environment
+    except ImportError as e:
+        raise ImportError(f"Could not import DataChannel: {e}")
+try:
+    from SmallShovelPy.RunRecord import RunRecord, TaskProfile, communicate_with_usage
+except ModuleNotFoundError:
+    try:
+        from RunRecord import RunRecord, TaskProfile, communicate_with_usage
+    except ImportError as e:
+        raise ImportError(f"Could not import RunRecord: {e}")
+try:
+    from SmallShovelPy.OutputStore import OutputStore
+except ModuleNotFoundError:
+    try:
+        from OutputStore import OutputStore
+    except ImportError as e:
+        raise ImportError(f"Could not import OutputStore: {e}")
+try:
+    from SmallShovelPy.ShellSession import ShellSession, SESSION_SHELLS
+except ModuleNotFoundError:
+    try:
+        from ShellSession import ShellSession, SESSION_SHELLS
+    except ImportError as e:
+        raise ImportError(f"Could not import ShellSession: {e}")
+try:
+    from SmallShovelPy.LogContext import LogContext
+except ModuleNotFoundError:
+    try:
+        from LogContext import LogContext
+    except ImportError as e:
+        raise ImportError(f"Could not import LogContext: {e}")
+
+# One accessor per match: [0], ['key'], ["key"] or a bare [key]
+REFERENCE_PATTERN = re.compile(r"""\[(?:(\d+)|'([^']*)'|"([^"]*)"|([a-zA-Z0-9_]+))\]""")
+
+
+def compile_reference(value):
+    '''
+    Parses a reference such as "outputs[0]['rows'][1]" into the accessor plan
+    (0, 'rows', 1), in source order. Returns None if `value` is not a reference.
+    '''
+    if not (isinstance(value, str) and value.startswith("outputs[") and value.endswith("]")):
+        return None
+
+    plan = []
+    for match in REFERENCE_PATTERN.finditer(value, len("outputs")):
+        digits, single_quoted, double_quoted, bare = match.groups()
+        if digits is not None:
+            plan.append(int(digits))
+        elif single_quoted is not None:
+            plan.append(single_quoted)
+        elif double_quoted is not None:
+            plan.append(double_quoted)
+        else:
+            plan.append(bare)
+
+    return tuple(plan)
+
+
+def parse_cli_args(key, value):
+    value = str(value)  # DataHandles and numbers are passed by their string form
+    if value == "":
+        return f"{key}"
+    elif "=" in value:
+        return f"{key}{value}"
+    else:
+        return f"{key} {value}"
+
+
+def cli_argv(key, value):
+    '''
+    Like parse_cli_args, but returns separate argv elements for running without a shell.
+    '''
+    value = str(value)
+    if value == "":
+        return [f"{key}"]
+    elif "=" in value:
+        return [f"{key}{value}"]
+    else:
+        return [f"{key}", value]
+
+
+def _run_command(command, stream_output=None, logger=None, usage=None):
+    '''
+    Runs a file or shell task's command and returns (output, succeeded), where the
+    output is stdout on success and stderr otherwise.
+    With `stream_output` set, output is forwarded line by line and only an
+    OutputStream window (or spill file path) is kept.
+    The child's resource usage is added to the `usage` dict when one is passed.
+    '''
+    if stream_output is None:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, env=task_environment())
+        returncode, stdout, stderr, child_usage = communicate_with_usage(process)
+        if usage is not None and child_usage:
+            usage.update(child_usage)
+        if returncode == 0:
+            return stdout, True
+        return stderr, False
+
+    returncode, stdout, stderr, child_usage = stream_subprocess(command, logger=logger, env=task_environment(), **stream_output)
+    if usage is not None and child_usage:
+        usage.update(child_usage)
+    if returncode == 0:
+        stderr.discard()
+        return stdout.getvalue(), True
+    else:
+        stdout.discard()
+        return stderr.getvalue(), False
+
+
+def _run_in_session(session, command, stream_output=None, logger=None):
+    '''
+    Runs a session mode shell task's command in the run's ShellSession and returns
+    (output, succeeded) like _run_command.
+    '''
+    if stream_output is None:
+        returncode, stdout, stderr = session.run(command)
+        if returncode == 0:
+            return stdout, True
+        return stderr, False
+
+    forward = line_forwarder(logger)
+    returncode, stdout, stderr = session.run(
+        command,
+        stdout=OutputStream(on_line=forward, **stream_output),
+        stderr=OutputStream(on_line=forward, **stream_output),
+    )
+    if returncode == 0:
+        stderr.discard()
+        return stdout.getvalue(), True
+    else:
+        stdout.discard()
+        return stderr.getvalue(), False
+
+
+def _submit(pool, fn, *args):
+    '''
+    Submits `fn` to an executor. On thread pools it runs in a copy of the caller's
+    context, so output capture and the Logger call depth follow the task onto the
+    worker thread. Process pools cannot carry a context.
+    '''
+    if isinstance(pool, ThreadPoolExecutor):
+        return pool.submit(contextvars.copy_context().run, fn, *args)
+    return pool.submit(fn, *args)
+
+
+def _for_process(task):
+    '''
+    Returns `task` without its TaskCache, which holds a lock and cannot be sent to a
+    process pool. Caching happens in the parent process anyway.
+    '''
+    if isinstance(task.get('cache'), TaskCache):
+        return dict(task, cache=False)
+    return task
+
+
+def _run_coroutine(coroutine):
+    '''
+    Drives a coroutine returned by an `async def` task to completion from sync code.
+    '''
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+
+    # Already inside an event loop (execute() called from async code), so use a
+    # private loop on another thread instead of nesting loops
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return _submit(pool, asyncio.run, coroutine).result()
+
+
+def _run_task(task, task_params, worker_pool=None, logger=None, usage=None, sessions=None):
+    '''
+    Runs a single task with already resolved parameters and returns (output, succeeded).
+    Kept at module level so it can be sent to a process pool.
+    `sessions` maps shell executables to the run's ShellSessions for session mode tasks.
+    '''
+    if task['task_type'] == 'func':
+        output = task['task'](**task_params)
+        if inspect.iscoroutine(output):
+            output = _run_coroutine(output)
+        return output, True
+
+    elif task['task_type'] == 'file':
+        argv = [parse_cli_args(key, value) for key, value in task_params.items()]
+
+        # Streaming tasks always get their own process so output can be read incrementally
+        if worker_pool is not None and task.get('stream_output') is None:
+            returncode, stdout, stderr = worker_pool.run(task['task'], argv, usage)
+            if returncode == 0:
+                return stdout, True
+            return stderr, False
+
+        return _run_command(['python', task['task']] + argv, task.get('stream_output'), logger, usage)
+
+    elif task['task_type'] == 'shell':
+        command = task['task']['command']
+        mode = task['task'].get('mode', 'shell')
+
+        if mode == 'direct':
+            # No shell at all: the command is split once and parameters stay separate arguments
+            if isinstance(command, list):
+                argv = list(command)
+            else:
+                argv = shlex.split(command, posix=os.name != 'nt')
+            for key, value in task_params.items():
+                argv += cli_argv(key, value)
+            return _run_command(argv, task.get('stream_output'), logger, usage)
+
+        additional_params = " ".join(parse_cli_args(key, value) for key, value in task_params.items())
+        command = f"{command} {additional_params}"
+
+        shell = task['task']['shell'].lower()
+        if mode == 'session':
+            if not sessions or SESSION_SHELLS[shell] not in sessions:
+                raise ValueError("Session mode shell tasks need the pipeline run's shell session and cannot run on a process pool or in map().")
+            return _run_in_session(sessions[SESSION_SHELLS[shell]], command, task.get('stream_output'), logger)
+
+        if shell.lower() == 'powershell':
+            # Run in PowerShell
+            shell_command = ['powershell', '-Command', command]
+            
+        elif shell.lower() == 'gitbash':
+            # Run in GitBash
+            shell_command = ['bash', '-c', command]
+            
+        elif shell.lower() == 'bash':
+            # Run in GitBash
+            shell_command = ['bash', '-c', command]
+            
+        elif shell.lower() == 'terminal':
+            # Run in Terminal (Unix shell)
+            shell_command = ['sh', '-c', command]
+            
+        elif shell.lower() == 'sh':
+            # Run in Terminal (Unix shell)
+            shell_command = ['sh', '-c', command]
+
+        elif shell.lower() == 'command prompt':
+            # Run in Command Prompt
+            shell_command = ['cmd', '/c', command]
+
+        elif shell.lower() == 'cmd':
+            # Run in Command Prompt
+            shell_command = ['cmd', '/c', command]
+        else:
+            raise ValueError(f"Unsupported shell type: {shell}")
+
+        return _run_command(shell_command, task.get('stream_output'), logger, usage)
+
+
+def _run_task_profiled(task, task_params, worker_pool=None, logger=None, sessions=None):
+    '''
+    Runs a task like _run_task and measures it where it runs, which may be a pool
+    worker. Returns (output, succeeded, metrics, error); `error` is the exception the
+    task raised, if any.
+    '''
+    profile = TaskProfile()
+    usage = {}
+    output, succeeded, error = None, False, None
+    try:
+        output, succeeded = _run_task(task, task_params, worker_pool, logger, usage, sessions)
+    except Exception as e:
+        error = e
+    return output, succeeded, profile.stop(usage), error
+
+
+def _run_chunk(task, chunk, worker_pool=None, logger=None):
+    '''
+    Runs one task over a chunk of (item number, params) pairs for Pipeline.map and
+    returns (item number, output, succeeded) triples.
+    '''
+    results = []
+    for n, task_params in chunk:
+        try:
+            output, succeeded = _run_task(task, task_params, worker_pool, logger)
+        except Exception as e:
+            output, succeeded = f"Item {n + 1} failed with error: {e}", False
+        results.append((n, output, succeeded))
+    return results
+
 
 class Pipeline:
-    def __init__(self, name):
+    def __init__(self, name, worker_pool=None, logger=None, cache=None, stream_buffer=8, data_channel=None, checkpoint_store=None):
         self.name = name
         self.tasks = []
+        self.worker_pool = worker_pool
+        self.logger = logger
+        self.cache = cache
+        self.stream_buffer = stream_buffer
+        self.data_channel = data_channel
+        self.checkpoint_store = checkpoint_store
+        self.last_run_id = None
+        self.last_run = None
+        self.cache_stats = {'hits': 0, 'misses': 0}
+        self._reference_plans = {}
+        self._published = []
+        self._spilled = []
+        self._owns_channel = False
 
-    def add_task(self, func=None, file=None, shell=None, command=None):
+    def add_task(self, func=None, file=None, shell=None, command=None, depends_on=None, stream_output=None, cache=False, streaming=False, publish=False, mode='shell'):
         '''
+        Adds a func, file or shell task to the pipeline.
+
+        `depends_on` optionally lists the indices of earlier tasks this task waits on
+        when the pipeline is executed with `parallel=True`.
+
+        `stream_output` (file and shell tasks) reads the subprocess output line by line,
+        forwarding each line to the pipeline's logger. Pass True, or a dict of
+        OutputStream options (`head`, `tail`, `spill`) to size what is kept as output.
+
+        `cache` reuses earlier results for the same task and resolved parameters,
+        skipping execution. Pass True to use the pipeline's TaskCache, or a TaskCache.
+
+        A func task that returns a generator or iterator produces a BatchStream. Tasks
+        added with `streaming=True` receive that stream and consume batches as they are
+        produced; other tasks receive the batches collected into a list.
+
+        With `publish=True`, a DataFrame or NumPy array returned by a func task is
+        written to the pipeline's DataChannel and `outputs[n]` holds its DataHandle.
+        The handle stays valid until the pipeline runs again or is closed.
+        File and shell tasks publish by printing a handle as their last line of output.
+
+        `mode` (shell tasks) picks how the command runs: 'shell' starts a new shell per
+        run, 'direct' splits the command into an argv list (or takes a list as is) and
+        runs it without a shell, passing every parameter as separate arguments, and 'session' (bash and sh only)
+        sends it to one shell shared by the whole pipeline run, so `cd` and `export`
+        carry over to later session tasks.
         '''
 
+        if depends_on is None:
+            depends_on = []
+        elif isinstance(depends_on, int):
+            depends_on = [depends_on]
+        else:
+            depends_on = list(depends_on)
+
+        for upstream in depends_on:
+            if not isinstance(upstream, int) or upstream < 0 or upstream >= len(self.tasks):
+                raise ValueError(f"Invalid dependency: {upstream}. Tasks can only depend on tasks added before them.")
+
+        if stream_output is True:
+            stream_output = {}
+        elif stream_output is False:
+            stream_output = None
+        elif stream_output is not None:
+            unknown = set(stream_output) - {'head', 'tail', 'spill'}
+            if unknown:
+                raise ValueError(f"Unsupported stream_output options: {sorted(unknown)}. Supported options are: head, tail, spill")
+            stream_output = dict(stream_output)
+
+        if stream_output is not None and func:
+            raise ValueError("stream_output is only supported for file and shell tasks.")
+
+        if cache is not True and cache is not False and not isinstance(cache, TaskCache):
+            raise ValueError("cache must be True, False or a TaskCache.")
+
+        if streaming and not func:
+            raise ValueError("streaming is only supported for func tasks.")
+
+        if publish and not func:
+            raise ValueError("publish is only supported for func tasks.")
+
+        if mode not in ('shell', 'direct', 'session'):
+            raise ValueError(f"Unsupported mode: {mode}. Supported modes are: shell, direct, session")
+
+        if mode != 'shell' and not (shell or command):
+            raise ValueError("mode is only supported for shell tasks.")
+
         if func:
             if file:
                 raise ValueError("Cannot specify func parameter and file at the same time.")
             elif shell or command:
                 raise ValueError("Cannot specify func parameter and shell/command at the same time.")
             elif callable(func):
-                self.tasks.append({'task_type': 'func', 'task': func})
+                self.tasks.append({'task_type': 'func', 'task': func, 'depends_on': depends_on, 'cache': cache, 'streaming': streaming, 'publish': publish})
             else:
                 raise ValueError("Func must be a callable function.")
             
@@ -27,7 +423,7 @@ class Pipeline:
             elif shell or command:
                 raise ValueError("Cannot specify file parameter and shell/command at the same time.")
             if os.path.isfile(file) and file.endswith('.py'):
-                self.tasks.append({'task_type': 'file', 'task': file})
+                self.tasks.append({'task_type': 'file', 'task': file, 'depends_on': depends_on, 'stream_output': stream_output, 'cache': cache})
             else:
                 raise ValueError("Invalid file path or file type. Must be an existing Python file.")
             
@@ -41,13 +437,23 @@ class Pipeline:
                     valid_shells = ['powershell', 'gitbash', 'bash', 'terminal', 'sh', 'cmd', 'command prompt']
                     if shell.lower() not in valid_shells:
                         raise ValueError(f"Unsupported shell type: {shell}. Supported types are: {valid_shells}")
-                    
+                    if mode == 'session' and shell.lower() not in SESSION_SHELLS:
+                        raise ValueError(f"Session mode is not supported for {shell}. Supported types are: {list(SESSION_SHELLS)}")
+                    if isinstance(command, (list, tuple)) and mode == 'direct':
+                        command = [str(arg) for arg in command]
+                    elif not isinstance(command, str):
+                        raise ValueError("Command must be a string, or a list of arguments in direct mode.")
+
                     self.tasks.append({
                         'task_type': 'shell',
                         'task': {
                             'shell': shell,
-                            'command': command
-                        }
+                            'command': command,
+                            'mode': mode
+                        },
+                        'depends_on': depends_on,
+                        'stream_output': stream_output,
+                        'cache': cache
                     })
             else:
                 raise ValueError("Must specify shell type and command to run together.")
@@ -57,122 +463,527 @@ class Pipeline:
         Method that removes a specified task from the `tasks` list
         '''
         try:
-            self.tasks.remove(self.tasks[task_index])
-        except ValueError:
+            self.tasks.pop(task_index)
+        except (ValueError, IndexError):
             print(f"{task_index} is not in the task list")
+            return
+
+        # Keep declared dependencies pointing at the same tasks after the shift
+        removed = task_index if task_index >= 0 else len(self.tasks) + 1 + task_index
+        for task in self.tasks:
+            task['depends_on'] = [
+                upstream - 1 if upstream > removed else upstream
+                for upstream in task.get('depends_on', []) if upstream != removed
+            ]
 
-    def execute(self, params=None):
+    def dependencies(self, params=None):
+        '''
+        Returns a list with the set of upstream task indices for every task, combining
+        the declared `depends_on` indices with any `outputs[n]` references in `params`.
+        '''
+        params = params or [{}]
+        deps = []
+
+        for i, task in enumerate(self.tasks):
+            upstream = set(task.get('depends_on', []))
+            if i < len(params):
+                for value in params[i].values():
+                    plan = self._reference_plan(value)
+                    # Forward references can never be satisfied, they fail when resolved
+                    if plan and isinstance(plan[0], int) and plan[0] < i:
+                        upstream.add(plan[0])
+            deps.append(upstream)
+
+        return deps
+
+    def _reference_plan(self, value):
+        '''
+        Returns the accessor plan for an "outputs[...]" reference, parsing each distinct
+        reference only once per pipeline. Plain values return None and are not cached.
+        '''
+        if not (isinstance(value, str) and value.startswith("outputs[")):
+            return None
+        try:
+            return self._reference_plans[value]
+        except KeyError:
+            if len(self._reference_plans) >= 1024:
+                # References are normally a handful per pipeline, generated ones must not pile up
+                self._reference_plans.clear()
+            plan = self._reference_plans[value] = compile_reference(value)
+            return plan
+
+    def _resolve_params(self, i, params, outputs, available=None):
+        '''
+        Builds the keyword arguments for task `i`, replacing "outputs[n]" references
+        with the matching values from `outputs`.
+        '''
+        task_params = {}
+
+        if i < len(params):
+            for key, value in params[i].items():
+                plan = self._reference_plan(value)
+                if plan is None:
+                    task_params[key] = value
+                    continue
+
+                if plan and available is not None and plan[0] not in available:
+                    raise IndexError("list index out of range")
+
+                # Only streaming tasks take batches as they come, everyone else gets a list
+                if plan and isinstance(outputs[plan[0]], BatchStream) and not self.tasks[i].get('streaming'):
+                    outputs[plan[0]] = list(outputs[plan[0]])
+
+                selection = outputs
+                for accessor in plan:
+                    selection = selection[accessor]
+                task_params[key] = selection
+
+        return task_params
+
+    def _cache_lookup(self, task, task_params):
+        '''
+        Returns (cache, key, hit, value) for a task. `cache` and `key` are None for
+        tasks that were not added with caching enabled or cannot be keyed.
+        '''
+        cache = task.get('cache')
+        if not cache or any(isinstance(value, BatchStream) for value in task_params.values()):
+            return None, None, False, None
+        if cache is True:
+            if self.cache is None:
+                self.cache = TaskCache()
+            cache = self.cache
+
+        key = cache.key(task, task_params)
+        if key is None:
+            return None, None, False, None
+        hit, value = cache.get(key)
+        self.cache_stats['hits' if hit else 'misses'] += 1
+        return cache, key, hit, value
+
+    def _cache_store(self, cache, key, output, succeeded):
+        # Failed runs and one-shot iterators are never worth replaying
+        if cache is not None and succeeded and not isinstance(output, Iterator):
+            cache.set(key, output)
+
+    def _wrap_output(self, task, output, succeeded=True):
+        '''
+        Turns raw task results into what downstream tasks see in `outputs`: generators
+        become BatchStreams and published data becomes DataHandles.
+        '''
+        if task['task_type'] == 'func':
+            if isinstance(output, Iterator):
+                return BatchStream(output, maxsize=self.stream_buffer)
+            if task.get('publish') and isinstance(output, (pd.DataFrame, np.ndarray)):
+                if self.data_channel is None:
+                    self.data_channel = DataChannel()
+                    self._owns_channel = True
+                handle = self.data_channel.publish(output)
+                self._published.append(handle)
+                return handle
+
+        elif succeeded and isinstance(output, str):
+            lines = output.strip().splitlines()
+            if lines and lines[-1].strip().startswith(URI_PREFIX):
+                # The subprocess leaves its data behind, this pipeline releases it
+                handle = DataHandle.from_uri(lines[-1].strip())
+                self._published.append(handle)
+                return handle
+
+        return output
+
+    def _checkpoint(self, run_id, i, output, succeeded):
+        if self.checkpoint_store is not None and run_id is not None:
+            self.checkpoint_store.save(run_id, i, output, succeeded)
+
+    def _finish_record(self, record):
+        '''
+        Stores the run record as `self.last_run` and, if the pipeline has a logger,
+        writes it there as one structured line.
+        '''
+        record.finish()
+        self.last_run = record
+        if self.logger is not None:
+            self.logger.write(f"{datetime.datetime.now()} - INFO  - Run record: {record.to_json()}")
+
+    def _open_sessions(self):
+        '''
+        Returns one ShellSession per shell used by session mode tasks, shared by every
+        task in the run. The shells themselves start on first use.
+        '''
+        sessions = {}
+        for task in self.tasks:
+            if task['task_type'] == 'shell' and task['task'].get('mode') == 'session':
+                executable = SESSION_SHELLS[task['task']['shell'].lower()]
+                if executable not in sessions:
+                    sessions[executable] = ShellSession(executable, env=task_environment())
+        return sessions
+
+    def _close_sessions(self, sessions):
+        for session in sessions.values():
+            session.close()
+
+    def _release_published(self, keep=()):
+        '''
+        Deletes the data published by earlier runs, except the handles in `keep`, and
+        the outputs they spilled to disk.
+        '''
+        for spilled in self._spilled:
+            spilled.release()
+        # Cleared in place, the run's OutputStore appends to this list
+        self._spilled.clear()
+
+        keep = [handle for handle in keep if isinstance(handle, DataHandle)]
+        own = self.data_channel.directory if self.data_channel is not None else None
+        for handle in self._published:
+            if handle not in keep:
+                # Handles printed by file and shell tasks live in their subprocess's channel
+                handle.release(prune=os.path.dirname(os.path.dirname(handle.manifest_path)) != own)
+        self._published = [handle for handle in self._published if handle in keep]
+
+    def close(self):
+        '''
+        Deletes everything the pipeline published or spilled, and the DataChannel it
+        created. Outputs holding DataHandles or SpilledOutputs cannot be read afterwards.
+        '''
+        self._release_published()
+        if self._owns_channel:
+            self.data_channel.close()
+            self.data_channel = None
+            self._owns_channel = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _start_run(self, params, run_id=None, keep=()):
+        '''
+        Returns the ID of a new run, also used to tag its structured log records, and
+        registers the run with the checkpoint store if there is one. Data published by
+        the previous run is released, apart from the outputs in `keep`.
+        '''
+        self._release_published(keep)
+        run_id = run_id or f"{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        if self.checkpoint_store is not None:
+            run_id = self.checkpoint_store.start_run(self.name, params, run_id=run_id)
+        self.last_run_id = run_id
+        return run_id
+
+    def execute(self, params=None, parallel=False, max_workers=None, executor='thread', retain='all'):
         '''
         Executes all tasks in the pipeline, passing parameters between tasks if specified.
+
+        File tasks run in `self.worker_pool` when one is set.
+        With `parallel=True` every task whose upstream tasks have finished is started at
+        once on a thread pool (or a process pool with `executor='process'`, which needs
+        picklable functions). Outputs are still returned in task order.
+        With a `checkpoint_store`, every task result is saved under `self.last_run_id`.
+
+        `retain` controls what happens to an output once every task that consumes it
+        has run: 'all' keeps it, 'spill' writes it to a temp file and returns a
+        SpilledOutput in its place, and 'final' drops it so only outputs no task
+        consumes are returned.
         '''
-        outputs = []
         params = params or [{}]  # Ensure params is a list of dictionaries
+        store = OutputStore(self.dependencies(params), retain, spilled=self._spilled)
+        run_id = self._start_run(params)
+        sessions = self._open_sessions()
+
+        try:
+            with LogContext(pipeline=self.name, run_id=run_id):
+                if parallel:
+                    return self._execute_parallel(params, max_workers, executor, run_id=run_id, store=store, sessions=sessions)
+                return self._execute_sequential(params, run_id=run_id, store=store, sessions=sessions)
+        finally:
+            self._close_sessions(sessions)
+
+    def resume(self, run_id, params=None, parallel=False, max_workers=None, executor='thread', retain='all'):
+        '''
+        Re-executes a checkpointed run. Only tasks that failed (or whose output could
+        not be saved) and the tasks downstream of them, following `depends_on` and
+        `outputs[n]` references, are run again; every other output is loaded from the
+        checkpoint. Params default to the ones the run was started with.
+        '''
+        if self.checkpoint_store is None:
+            raise ValueError("Pipeline has no checkpoint_store to resume from.")
+
+        run = self.checkpoint_store.load(run_id)
+        params = params or run['params'] or [{}]
+        deps = self.dependencies(params)
+        store = OutputStore(deps, retain, spilled=self._spilled)
+
+        rerun = set()
+        for i in range(len(self.tasks)):
+            record = run['tasks'].get(i)
+            # Upstream indices are always lower, so one forward pass covers all descendants
+            if record is None or not record['succeeded'] or not record['persisted'] or deps[i] & rerun:
+                rerun.add(i)
+
+        preloaded = {i: run['tasks'][i]['output'] for i in range(len(self.tasks)) if i not in rerun}
+        run_id = self._start_run(params, run_id=run_id, keep=preloaded.values())
+        sessions = self._open_sessions()
+
+        try:
+            with LogContext(pipeline=self.name, run_id=run_id):
+                if parallel:
+                    return self._execute_parallel(params, max_workers, executor, run_id=run_id, preloaded=preloaded, store=store, sessions=sessions)
+                return self._execute_sequential(params, run_id=run_id, preloaded=preloaded, store=store, sessions=sessions)
+        finally:
+            self._close_sessions(sessions)
+
+    def _execute_sequential(self, params, run_id=None, preloaded=None, store=None, sessions=None):
+        preloaded = preloaded or {}
+        store = store or OutputStore(self.dependencies(params))
+        outputs = []
+        self.cache_stats = {'hits': 0, 'misses': 0}
+        record = RunRecord(self.name, run_id)
 
         for i, task in enumerate(self.tasks):
+            if i in preloaded:
+                outputs.append(preloaded[i])
+                record.add_task(i, succeeded=True, checkpointed=True)
+                store.task_finished(i, outputs)
+                continue
+
+            hit, metrics, resolve_time = False, {}, None
             try:
-                task_params = {}
-                
-                # Replace "outputs[n]" in params with actual outputs
-                if i < len(params):
-                    for key, value in params[i].items():
-                        if isinstance(value, str) and value.startswith("outputs[") and value.endswith("]"):
-
-                            pattern1 = r"\[[a-zA-Z0-9]+\]"
-                            pattern2 = r"\['[a-zA-Z0-9]+\']"
-                            pattern3 = r'\["[a-zA-Z0-9]+\"]'
-                            matches = re.findall(pattern1, value)
-                            matches += re.findall(pattern2, value)
-                            matches += re.findall(pattern3, value)
-
-                            selection = outputs
-
-                            for match in matches:
-                                sub_key = match.split('[')[1].split(']')[0]
-                                if sub_key.isdigit():
-                                    i = int(sub_key)
-                                    selection = selection[i]
-                                else:
-                                    sub_key = sub_key.replace("'","").replace('"',"")
-                                    selection = selection[sub_key]
-                            task_params[key] = selection
-                        else: 
-                            task_params[key] = value
-
-                if task['task_type'] == 'func':
-                    output = task['task'](**task_params)
-                    outputs.append(output)
-
-                elif task['task_type'] == 'file':
-                    command = ['python', task['task']]
-
-                    def parse_cli_args(key, value):
-                        if value == "":
-                            return f"{key}"
-                        elif "=" in value:
-                            return f"{key}{value}"
-                        else:
-                            return f"{key} {value}"
-                        
-                    for key, value in task_params.items():
-                        command.append(parse_cli_args(key, value))
-
-                    result = subprocess.run(command, capture_output=True, text=True)
-                    output = result.stdout if result.returncode == 0 else result.stderr
-                    outputs.append(output)
-
-                elif task['task_type'] == 'shell':
-                    command = task['task']['command']
-
-                    def parse_cli_args(key, value):
-                        if value == "":
-                            return f"{key}"
-                        elif "=" in value:
-                            return f"{key}{value}"
-                        else:
-                            return f"{key} {value}"
-                    additional_params = " ".join(parse_cli_args(key, value) for key, value in task_params.items())
-                    command = f"{command} {additional_params}"
-
-                    shell = task['task']['shell'].lower()
-                    if shell.lower() == 'powershell':
-                        # Run in PowerShell
-                        shell_command = ['powershell', '-Command', command]
-                        
-                    elif shell.lower() == 'gitbash':
-                        # Run in GitBash
-                        shell_command = ['bash', '-c', command]
-                        
-                    elif shell.lower() == 'bash':
-                        # Run in GitBash
-                        shell_command = ['bash', '-c', command]
-                        
-                    elif shell.lower() == 'terminal':
-                        # Run in Terminal (Unix shell)
-                        shell_command = ['sh', '-c', command]
-                        
-                    elif shell.lower() == 'sh':
-                        # Run in Terminal (Unix shell)
-                        shell_command = ['sh', '-c', command]
-
-                    elif shell.lower() == 'command prompt':
-                        # Run in Command Prompt
-                        shell_command = ['cmd', '/c', command]
-
-                    elif shell.lower() == 'cmd':
-                        # Run in Command Prompt
-                        shell_command = ['cmd', '/c', command]
-                    else:
-                        return "Error: Unsupported shell type."
-
-                    result = subprocess.run(shell_command, capture_output=True, text=True)
-                    output = result.stdout if result.returncode == 0 else result.stderr
-                    outputs.append(output)
+                resolve_start = time.perf_counter()
+                task_params = self._resolve_params(i, params, outputs)
+                resolve_time = time.perf_counter() - resolve_start
 
+                cache, key, hit, output = self._cache_lookup(task, task_params)
+                succeeded = True
+                if not hit:
+                    with LogContext(task=i):
+                        output, succeeded, metrics, error = _run_task_profiled(task, task_params, self.worker_pool, self.logger, sessions)
+                    if error is not None:
+                        raise error
+                    self._cache_store(cache, key, output, succeeded)
+                outputs.append(self._wrap_output(task, output, succeeded))
             except Exception as e:
                 outputs.append(f"Task {i + 1} failed with error: {e}")
+                succeeded = False
+            self._checkpoint(run_id, i, outputs[i], succeeded)
+            record.add_task(i, succeeded=succeeded, cached=hit, resolve_time=resolve_time, **metrics)
+            store.task_finished(i, outputs)
 
+        self._finish_record(record)
         return outputs
 
+    def _execute_parallel(self, params, max_workers, executor, run_id=None, preloaded=None, store=None, sessions=None):
+        if executor == 'thread':
+            pool_class = ThreadPoolExecutor
+        elif executor == 'process':
+            pool_class = ProcessPoolExecutor
+        else:
+            raise ValueError(f"Unsupported executor: {executor}. Use 'thread' or 'process'.")
+
+        # Worker pools, loggers and shell sessions live in this process and are not sent to a process pool
+        worker_pool = self.worker_pool if executor == 'thread' else None
+        logger = self.logger if executor == 'thread' else None
+        sessions = sessions if executor == 'thread' else None
+
+        preloaded = preloaded or {}
+        deps = self.dependencies(params)
+        store = store or OutputStore(deps)
+        outputs = [preloaded.get(i) for i in range(len(self.tasks))]
+        pending = [i for i in range(len(self.tasks)) if i not in preloaded]
+        finished = set(preloaded)
+        running = {}
+        self.cache_stats = {'hits': 0, 'misses': 0}
+        record = RunRecord(self.name, run_id)
+        for i in preloaded:
+            record.add_task(i, succeeded=True, checkpointed=True)
+            store.task_finished(i, outputs)
+
+        with pool_class(max_workers=max_workers) as pool:
+            while pending or running:
+                for i in [i for i in pending if deps[i] <= finished]:
+                    pending.remove(i)
+                    try:
+                        resolve_start = time.perf_counter()
+                        task_params = self._resolve_params(i, params, outputs, available=finished)
+                        record.add_task(i, resolve_time=time.perf_counter() - resolve_start)
+
+                        cache, key, hit, output = self._cache_lookup(self.tasks[i], task_params)
+                        if hit:
+                            outputs[i] = self._wrap_output(self.tasks[i], output)
+                            finished.add(i)
+                            self._checkpoint(run_id, i, outputs[i], True)
+                            record.add_task(i, succeeded=True, cached=True)
+                            store.task_finished(i, outputs)
+                        else:
+                            # The copied context carries the task index into the worker thread
+                            task = self.tasks[i] if executor == 'thread' else _for_process(self.tasks[i])
+                            with LogContext(task=i):
+                                future = _submit(pool, _run_task_profiled, task, task_params, worker_pool, logger, sessions)
+                            running[future] = (i, cache, key)
+                    except Exception as e:
+                        outputs[i] = f"Task {i + 1} failed with error: {e}"
+                        finished.add(i)
+                        self._checkpoint(run_id, i, outputs[i], False)
+                        record.add_task(i, succeeded=False, cached=False)
+                        store.task_finished(i, outputs)
+
+                if not running:
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i, cache, key = running.pop(future)
+                    metrics = {}
+                    try:
+                        output, succeeded, metrics, error = future.result()
+                        if error is not None:
+                            raise error
+                        self._cache_store(cache, key, output, succeeded)
+                        outputs[i] = self._wrap_output(self.tasks[i], output, succeeded)
+                    except Exception as e:
+                        outputs[i] = f"Task {i + 1} failed with error: {e}"
+                        succeeded = False
+                    finished.add(i)
+                    self._checkpoint(run_id, i, outputs[i], succeeded)
+                    record.add_task(i, succeeded=succeeded, cached=False, **metrics)
+                    store.task_finished(i, outputs)
+
+        self._finish_record(record)
+        return outputs
+
+    def map(self, task, param_iterable, workers=None, chunksize=1, executor='process', ordered=True):
+        '''
+        Runs one task once per parameter dict in `param_iterable`, spreading the work
+        over `workers` processes (or threads with `executor='thread'`). Items are sent
+        to workers `chunksize` at a time and only a few chunks per worker are queued,
+        so the iterable is consumed lazily.
+
+        `task` is the index of a task in this pipeline or a callable. Results come
+        back in input order, or in completion order with `ordered=False`.
+        '''
+        if isinstance(task, int):
+            task = self.tasks[task]
+        elif callable(task):
+            task = {'task_type': 'func', 'task': task, 'depends_on': []}
+        else:
+            raise ValueError("Task must be a task index or a callable function.")
+
+        if chunksize < 1:
+            raise ValueError("chunksize must be at least 1.")
+
+        if executor == 'thread':
+            pool_class = ThreadPoolExecutor
+            worker_pool, logger = self.worker_pool, self.logger
+        elif executor == 'process':
+            pool_class = ProcessPoolExecutor
+            worker_pool, logger = None, None
+            task = _for_process(task)
+        else:
+            raise ValueError(f"Unsupported executor: {executor}. Use 'thread' or 'process'.")
+
+        items = enumerate(param_iterable)
+        results = {}
+        completed = []
+        running = set()
+
+        # Keep every worker busy with one chunk queued behind it
+        max_in_flight = 2 * (workers or os.cpu_count() or 1)
+
+        with pool_class(max_workers=workers) as pool:
+
+            def submit_next():
+                chunk = list(islice(items, chunksize))
+                if chunk:
+                    running.add(_submit(pool, _run_chunk, task, chunk, worker_pool, logger))
+                return bool(chunk)
+
+            while len(running) < max_in_flight and submit_next():
+                pass
+
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    running.remove(future)
+                    for n, output, succeeded in future.result():
+                        output = self._wrap_output(task, output, succeeded)
+                        if ordered:
+                            results[n] = output
+                        else:
+                            completed.append(output)
+                    submit_next()
+
+        if ordered:
+            return [results[n] for n in range(len(results))]
+        return completed
+
+    async def execute_async(self, params=None, max_workers=None, retain='all'):
+        '''
+        Executes the pipeline on the running event loop. `async def` tasks are awaited
+        directly and every other task runs on a thread pool of `max_workers` threads.
+        Each task starts as soon as its upstream tasks have finished, and outputs are
+        returned in task order. `retain` works as in `execute()`.
+        '''
+        params = params or [{}]  # Ensure params is a list of dictionaries
+        deps = self.dependencies(params)
+        store = OutputStore(deps, retain, spilled=self._spilled)
+        run_id = self._start_run(params)
+
+        loop = asyncio.get_running_loop()
+        outputs = [None] * len(self.tasks)
+        finished = set()
+        done_events = [asyncio.Event() for _ in self.tasks]
+        self.cache_stats = {'hits': 0, 'misses': 0}
+        record = RunRecord(self.name, run_id)
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        sessions = self._open_sessions()
+
+        async def run(i, task):
+            for upstream in deps[i]:
+                await done_events[upstream].wait()
+
+            hit, metrics, resolve_time = False, {}, None
+            try:
+                resolve_start = time.perf_counter()
+                task_params = self._resolve_params(i, params, outputs, available=finished)
+                resolve_time = time.perf_counter() - resolve_start
+
+                cache, key, hit, output = self._cache_lookup(task, task_params)
+                succeeded = True
+                if not hit:
+                    # Each run() is its own asyncio task, so the field stays with it
+                    with LogContext(task=i):
+                        if task['task_type'] == 'func' and inspect.iscoroutinefunction(task['task']):
+                            # Coroutines share the loop thread, so only wall time is attributable
+                            profile = TaskProfile()
+                            output, succeeded = await task['task'](**task_params), True
+                            metrics = profile.stop()
+                            metrics.update(cpu_time=None, peak_rss=None, read_bytes=None, write_bytes=None)
+                        else:
+                            output, succeeded, metrics, error = await loop.run_in_executor(
+                                executor, contextvars.copy_context().run, _run_task_profiled, task, task_params, self.worker_pool, self.logger, sessions
+                            )
+                            if error is not None:
+                                raise error
+                    self._cache_store(cache, key, output, succeeded)
+                outputs[i] = self._wrap_output(task, output, succeeded)
+            except Exception as e:
+                outputs[i] = f"Task {i + 1} failed with error: {e}"
+                succeeded = False
+            finally:
+                finished.add(i)
+                done_events[i].set()
+            self._checkpoint(run_id, i, outputs[i], succeeded)
+            record.add_task(i, succeeded=succeeded, cached=hit, resolve_time=resolve_time, **metrics)
+            store.task_finished(i, outputs)
+
+        with LogContext(pipeline=self.name, run_id=run_id):
+            try:
+                await asyncio.gather(*(run(i, task) for i, task in enumerate(self.tasks)))
+            finally:
+                executor.shutdown(wait=False)
+                self._close_sessions(sessions)
+
+            self._finish_record(record)
+        return outputs
 
     def __repr__(self):
         return f"Pipeline(name={self.name}, tasks={len(self.tasks)})"
@@ -0,0 +1,206 @@
+import os
+import sys
+import json
+import time
+import threading
+import datetime
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Not available on Windows
+
+
+def _maxrss_bytes(maxrss):
+    # ru_maxrss is reported in bytes on macOS and in kilobytes everywhere else
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def wait_with_usage(process):
+    '''
+    Waits for a Popen process and returns (returncode, usage), where usage holds the
+    child's CPU time, peak RSS and block I/O, or is None where os.wait4 is missing.
+    '''
+    if not hasattr(os, "wait4"):
+        return process.wait(), None
+
+    try:
+        _, status, rusage = os.wait4(process.pid, 0)
+    except ChildProcessError:
+        # Already reaped elsewhere, nothing left to measure
+        return process.wait(), None
+
+    if os.WIFSIGNALED(status):
+        process.returncode = -os.WTERMSIG(status)
+    else:
+        process.returncode = os.WEXITSTATUS(status)
+
+    return process.returncode, {
+        "cpu_time": rusage.ru_utime + rusage.ru_stime,
+        "peak_rss": _maxrss_bytes(rusage.ru_maxrss),
+        "read_bytes": rusage.ru_inblock * 512,
+        "write_bytes": rusage.ru_oublock * 512,
+    }
+
+
+def communicate_with_usage(process):
+    '''
+    Like Popen.communicate, but also returns the child's resource usage:
+    (returncode, stdout, stderr, usage).
+    '''
+    output = {}
+
+    def read(name, stream):
+        output[name] = stream.read()
+        stream.close()
+
+    readers = [
+        threading.Thread(target=read, args=("stdout", process.stdout), daemon=True),
+        threading.Thread(target=read, args=("stderr", process.stderr), daemon=True),
+    ]
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join()
+
+    returncode, usage = wait_with_usage(process)
+    return returncode, output["stdout"], output["stderr"], usage
+
+
+class TaskProfile:
+    """
+    Measures one task run in the current thread: wall and CPU time, peak RSS and
+    I/O. RSS and I/O are process-wide, so they include concurrently running tasks.
+    """
+    def __init__(self):
+        self.started_at = datetime.datetime.now()
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+        self._io = self._io_counters()
+
+    @staticmethod
+    def _io_counters():
+        if psutil is None:
+            return None
+        try:
+            counters = psutil.Process().io_counters()
+            return counters.read_bytes, counters.write_bytes
+        except (AttributeError, psutil.Error):
+            return None
+
+    @staticmethod
+    def _peak_rss():
+        if resource is not None:
+            return _maxrss_bytes(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+        if psutil is not None:
+            return psutil.Process().memory_info().rss
+        return None
+
+    def stop(self, subprocess_usage=None):
+        '''
+        Returns the task metrics. `subprocess_usage` from wait_with_usage replaces the
+        in-process CPU, memory and I/O numbers for file and shell tasks.
+        '''
+        metrics = {
+            "start": self.started_at.isoformat(),
+            "end": datetime.datetime.now().isoformat(),
+            "wall_time": time.perf_counter() - self._wall,
+            "cpu_time": time.thread_time() - self._cpu,
+            "peak_rss": self._peak_rss(),
+            "read_bytes": None,
+            "write_bytes": None,
+        }
+
+        io = self._io_counters()
+        if io is not None and self._io is not None:
+            metrics["read_bytes"] = io[0] - self._io[0]
+            metrics["write_bytes"] = io[1] - self._io[1]
+
+        if subprocess_usage:
+            metrics.update(subprocess_usage)
+
+        return metrics
+
+
+class RunRecord:
+    """
+    Structured record of one pipeline execution with per-task metrics.
+    """
+    def __init__(self, pipeline, run_id=None):
+        self.pipeline = pipeline
+        self.run_id = run_id
+        self.started_at = datetime.datetime.now()
+        self.ended_at = None
+        self.tasks = {}
+
+    def add_task(self, index, **metrics):
+        self.tasks.setdefault(index, {}).update(metrics)
+
+    def finish(self):
+        self.ended_at = datetime.datetime.now()
+
+    @property
+    def wall_time(self):
+        end = self.ended_at or datetime.datetime.now()
+        return (end - self.started_at).total_seconds()
+
+    def hot_spot(self):
+        '''
+        Returns the index of the task with the longest wall time.
+        '''
+        if not self.tasks:
+            return None
+        return max(self.tasks, key=lambda i: self.tasks[i].get("wall_time") or 0)
+
+    def summary(self, max_length=1000):
+        '''
+        Returns a short text version of the record, one line per task, that fits in
+        `max_length` characters (the Client's control socket replies are read in 1 KB).
+        '''
+        hot_spot = self.hot_spot()
+        lines = [f"{self.pipeline} run {self.run_id}: {self.wall_time:.3f}s" + (f", hot spot: task {hot_spot + 1}" if hot_spot is not None else "")]
+        length = len(lines[0])
+        for n, i in enumerate(sorted(self.tasks)):
+            metrics = self.tasks[i]
+            if metrics.get("checkpointed"):
+                status = "checkpointed"
+            elif metrics.get("cached"):
+                status = "cached"
+            else:
+                status = "ok" if metrics.get("succeeded") else "failed"
+            line = f"  task {i + 1}: {status}"
+            if metrics.get("wall_time") is not None:
+                line += f", wall {metrics['wall_time']:.3f}s"
+            if metrics.get("cpu_time") is not None:
+                line += f", cpu {metrics['cpu_time']:.3f}s"
+            if metrics.get("peak_rss") is not None:
+                line += f", peak rss {metrics['peak_rss'] / 1024 / 1024:.1f} MB"
+
+            more = f"  ... {len(self.tasks) - n} more tasks"
+            if length + len(line) + len(more) + 2 > max_length:
+                lines.append(more)
+                break
+            lines.append(line)
+            length += len(line) + 1
+        return "\n".join(lines)
+
+    def to_dict(self):
+        return {
+            "pipeline": self.pipeline,
+            "run_id": self.run_id,
+            "start": self.started_at.isoformat(),
+            "end": self.ended_at.isoformat() if self.ended_at else None,
+            "wall_time": self.wall_time,
+            "tasks": [dict(self.tasks[i], task=i) for i in sorted(self.tasks)],
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), default=str)
+
+    def __repr__(self):
+        return f"RunRecord(pipeline={self.pipeline}, tasks={len(self.tasks)}, wall_time={self.wall_time:.3f})"
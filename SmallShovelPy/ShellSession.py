@@ -0,0 +1,138 @@
+import queue
+import shlex
+import uuid
+import threading
+import subprocess
+
+
+# Shells that can host a session, by the names add_task accepts
+SESSION_SHELLS = {'bash': 'bash', 'gitbash': 'bash', 'sh': 'sh', 'terminal': 'sh'}
+
+
+class _Collector:
+    def __init__(self):
+        self.lines = []
+
+    def feed(self, line):
+        self.lines.append(line)
+
+    def getvalue(self):
+        return "".join(self.lines)
+
+
+class ShellSession:
+    """
+    One long-lived bash or sh process that runs shell task commands one after the
+    other, so `cd`, `export` and shell variables carry over between tasks. Each
+    command's output ends at a sentinel line that also carries its exit code.
+    """
+    def __init__(self, shell='sh', env=None):
+        if shell not in SESSION_SHELLS.values():
+            raise ValueError(f"Unsupported session shell: {shell}. Supported shells are: {sorted(set(SESSION_SHELLS.values()))}")
+        self.shell = shell
+        self.env = env
+        self.commands = 0
+        self._process = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        self._process = subprocess.Popen(
+            [self.shell], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, bufsize=1,
+            env=self.env,
+        )
+        self._stdout = queue.Queue()
+        self._stderr = queue.Queue()
+        for stream, lines in ((self._process.stdout, self._stdout), (self._process.stderr, self._stderr)):
+            threading.Thread(target=self._read, args=(stream, lines), daemon=True).start()
+
+    @staticmethod
+    def _read(stream, lines):
+        for line in iter(stream.readline, ""):
+            lines.put(line)
+        lines.put(None)  # The shell exited
+
+    @staticmethod
+    def _drain(lines, marker, sink):
+        '''
+        Feeds lines to `sink` up to the sentinel and returns the sentinel line, or None
+        if the shell exited first. The sentinel is printed after a newline of our own,
+        which is taken off the last line again.
+        '''
+        pending = None
+        while True:
+            line = lines.get()
+            if line is None or line.startswith(marker):
+                if pending:
+                    pending = pending[:-1] if line is not None else pending
+                    if pending:
+                        sink.feed(pending)
+                return line
+            if pending is not None:
+                sink.feed(pending)
+            pending = line
+
+    def run(self, command, stdout=None, stderr=None):
+        '''
+        Runs `command` in the session and returns (returncode, stdout, stderr).
+        Output is collected into strings, or fed line by line to the given
+        OutputStreams, which are then returned in place of the strings.
+        '''
+        stdout_sink = stdout if stdout is not None else _Collector()
+        stderr_sink = stderr if stderr is not None else _Collector()
+        marker = f"__smallshovel_{uuid.uuid4().hex}__"
+
+        # `command eval` keeps the shell alive on syntax errors, and /dev/null keeps
+        # commands from reading the rest of the session script from stdin
+        script = (
+            f"command eval {shlex.quote(command)} < /dev/null\n"
+            f"printf '\\n{marker} %s\\n' \"$?\"\n"
+            f"printf '\\n{marker}\\n' >&2\n"
+        )
+
+        with self._lock:
+            if self._process is None or self._process.poll() is not None:
+                self._start()
+            self.commands += 1
+
+            try:
+                self._process.stdin.write(script)
+                self._process.stdin.flush()
+            except (BrokenPipeError, OSError):
+                pass  # Reported below once the readers see the shell is gone
+
+            sentinel = self._drain(self._stdout, marker, stdout_sink)
+            stderr_sentinel = self._drain(self._stderr, marker, stderr_sink)
+
+            if sentinel is None or stderr_sentinel is None:
+                # The command ended the shell (e.g. `exit`), the next one starts a fresh session
+                returncode = self._process.wait()
+                self._process = None
+            else:
+                returncode = int(sentinel[len(marker):].strip())
+
+        return (
+            returncode,
+            stdout_sink if stdout is not None else stdout_sink.getvalue(),
+            stderr_sink if stderr is not None else stderr_sink.getvalue(),
+        )
+
+    def close(self):
+        with self._lock:
+            if self._process is None:
+                return
+            try:
+                self._process.stdin.close()
+                self._process.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self._process.kill()
+                self._process.wait()
+            self._process = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return f"ShellSession(shell={self.shell}, commands={self.commands})"
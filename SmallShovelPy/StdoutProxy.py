@@ -0,0 +1,53 @@
+import sys
+import contextvars
+
+
+_target = contextvars.ContextVar("smallshovel_stdout", default=None)
+
+
+class StdoutProxy:
+    """
+    Stand-in for sys.stdout that forwards every write to the stream selected for the
+    current context (thread, asyncio task or copied context), falling back to the
+    real stdout. Captured functions redirect only their own context, so concurrent
+    pipelines never swap each other's output streams.
+    """
+    def __init__(self, stream):
+        self.stream = stream
+
+    @classmethod
+    def install(cls):
+        '''
+        Puts a proxy in front of the current sys.stdout, once, and returns it.
+        '''
+        if not isinstance(sys.stdout, StdoutProxy):
+            sys.stdout = cls(sys.stdout)
+        return sys.stdout
+
+    @staticmethod
+    def redirect(stream):
+        '''
+        Sends this context's output to `stream`. Returns a token for `restore`.
+        '''
+        return _target.set(stream)
+
+    @staticmethod
+    def restore(token):
+        _target.reset(token)
+
+    def current(self):
+        stream = _target.get()
+        return stream if stream is not None else self.stream
+
+    def write(self, message):
+        return self.current().write(message)
+
+    def flush(self):
+        self.current().flush()
+
+    def __getattr__(self, name):
+        # encoding, isatty, fileno, ... of whatever stream is active
+        return getattr(self.current(), name)
+
+    def __repr__(self):
+        return f"StdoutProxy(stream={self.stream})"
@@ -0,0 +1,189 @@
+import os
+import time
+import pickle
+import marshal
+import hashlib
+import inspect
+import threading
+from collections import OrderedDict
+
+
+class TaskCache:
+    """
+    Content-addressed cache of task results. Entries live in an in-memory LRU and,
+    when `directory` is set, in an on-disk tier of pickle files.
+    """
+    def __init__(self, max_entries=128, ttl=None, directory=None, max_disk_mb=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.directory = directory
+        self.max_disk_mb = max_disk_mb
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def function_state(func):
+        '''
+        Returns a digest of what a function's source does not show: its bytecode,
+        defaults, closure values and bound instance. Closures built from the same
+        source, or methods of different instances, differ here. Returns None if any
+        of it cannot be pickled.
+        '''
+        bound = getattr(func, "__self__", None)
+        func = getattr(func, "__func__", func)
+        code = getattr(func, "__code__", None)
+        try:
+            if code is None:
+                # A callable object, its attributes are its state
+                return hashlib.sha256(pickle.dumps(func, protocol=4)).hexdigest()
+            cells = tuple(cell.cell_contents for cell in func.__closure__ or ())
+            state = pickle.dumps((func.__defaults__, func.__kwdefaults__, cells, bound), protocol=4)
+            return hashlib.sha256(marshal.dumps(code) + state).hexdigest()
+        except Exception:
+            return None
+
+    @staticmethod
+    def task_identity(task):
+        '''
+        Returns a string identifying what a task runs: the function source and state,
+        the file path plus its modification time, or the shell command. Returns None
+        for functions whose state cannot be captured, which are then not cached.
+        '''
+        if task['task_type'] == 'func':
+            func = task['task']
+            state = TaskCache.function_state(func)
+            if state is None:
+                return None
+            if hasattr(func, "source_code"):
+                return f"func:{func.source_code}:{state}"
+            try:
+                return f"func:{inspect.getsource(func)}:{state}"
+            except (OSError, TypeError):
+                return f"func:{getattr(func, '__module__', '')}.{getattr(func, '__qualname__', repr(func))}:{state}"
+
+        elif task['task_type'] == 'file':
+            path = os.path.abspath(task['task'])
+            return f"file:{path}:{os.path.getmtime(path)}"
+
+        else:
+            return f"shell:{task['task']['shell'].lower()}:{task['task']['command']}"
+
+    def key(self, task, task_params):
+        '''
+        Builds the cache key for a task and its resolved parameters, or returns None
+        if the task cannot be identified reliably.
+        '''
+        identity = self.task_identity(task)
+        if identity is None:
+            return None
+
+        items = sorted(task_params.items())
+        try:
+            params_bytes = pickle.dumps(items, protocol=4)
+        except Exception:
+            params_bytes = repr(items).encode()
+
+        digest = hashlib.sha256()
+        digest.update(identity.encode())
+        digest.update(b"\0")
+        digest.update(params_bytes)
+        return digest.hexdigest()
+
+    def _expired(self, stored_at):
+        return self.ttl is not None and time.time() - stored_at > self.ttl
+
+    def _disk_path(self, key):
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def get(self, key):
+        '''
+        Returns (hit, value) for `key`, checking memory first and then disk.
+        '''
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if not self._expired(stored_at):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._memory[key]
+
+            if self.directory and os.path.isfile(self._disk_path(key)):
+                try:
+                    with open(self._disk_path(key), "rb") as file:
+                        stored_at, value = pickle.load(file)
+                except Exception:
+                    # Corrupt or partially written entries count as a miss
+                    os.remove(self._disk_path(key))
+                else:
+                    if not self._expired(stored_at):
+                        self._remember(key, stored_at, value)
+                        self.hits += 1
+                        return True, value
+                    os.remove(self._disk_path(key))
+
+            self.misses += 1
+            return False, None
+
+    def _remember(self, key, stored_at, value):
+        self._memory[key] = (stored_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def set(self, key, value):
+        stored_at = time.time()
+        with self._lock:
+            self._remember(key, stored_at, value)
+
+            if self.directory:
+                try:
+                    data = pickle.dumps((stored_at, value), protocol=4)
+                except Exception:
+                    # Unpicklable results stay in the memory tier only
+                    return
+                with open(self._disk_path(key), "wb") as file:
+                    file.write(data)
+                self._evict_disk()
+
+    def _evict_disk(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".pkl"):
+                path = os.path.join(self.directory, name)
+                stat = os.stat(path)
+                if self.ttl is not None and time.time() - stat.st_mtime > self.ttl:
+                    os.remove(path)
+                else:
+                    entries.append((stat.st_mtime, stat.st_size, path))
+
+        if self.max_disk_mb is None:
+            return
+
+        # Oldest entries go first until the tier fits its budget
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        while entries and total > self.max_disk_mb * 1024 * 1024:
+            _, size, path = entries.pop(0)
+            os.remove(path)
+            total -= size
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self.directory:
+                for name in os.listdir(self.directory):
+                    if name.endswith(".pkl"):
+                        os.remove(os.path.join(self.directory, name))
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._memory)}
+
+    def __repr__(self):
+        return f"TaskCache(entries={len(self._memory)}, max_entries={self.max_entries}, directory={self.directory})"
@@ -0,0 +1,267 @@
+import os
+import json
+import queue
+import threading
+import subprocess
+try:
+    from SmallShovelPy.DataChannel import task_environment
+except ModuleNotFoundError:
+    try:
+        from DataChannel import task_environment
+    except ImportError as e:
+        raise ImportError(f"Could not import DataChannel: {e}")
+
+
+# Source of the worker interpreter. Requests arrive as JSON lines on stdin and
+# results go back as JSON lines on a private copy of the original stdout, so
+# anything a script writes to file descriptor 1 directly ends up on stderr
+# instead of corrupting the protocol.
+WORKER_SOURCE = r'''
+import io
+import os
+import sys
+import json
+import time
+import runpy
+import importlib
+import traceback
+
+protocol = os.fdopen(os.dup(1), "w")
+os.dup2(2, 1)
+
+for module_name in json.loads(sys.argv[1]):
+    try:
+        importlib.import_module(module_name)
+    except Exception:
+        pass
+
+
+def current_rss():
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except Exception:
+        pass
+    try:
+        import resource
+        # Peak rather than current usage, reported in KB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except Exception:
+        return None
+
+
+def reply(message):
+    protocol.write(json.dumps(message) + "\n")
+    protocol.flush()
+
+
+requests = sys.stdin
+sys.stdin = io.StringIO()
+
+base_path = list(sys.path[1:])
+base_cwd = os.getcwd()
+base_environ = dict(os.environ)
+base_modules = set(sys.modules)
+
+
+# Modules imported since startup from the script's own directory. Installed
+# packages stay loaded, C extensions cannot be imported twice in one process.
+def local_modules(script_dir):
+    names = []
+    for name, module in list(sys.modules.items()):
+        path = getattr(module, "__file__", None)
+        if name in base_modules or not path:
+            continue
+        if os.path.abspath(path).startswith(script_dir + os.sep):
+            names.append(name)
+    return names
+
+
+reply({"ready": True})
+
+for line in requests:
+    job = json.loads(line)
+    stdout, stderr = io.StringIO(), io.StringIO()
+    returncode = 0
+    cpu_start = time.process_time()
+
+    script_dir = os.path.dirname(os.path.abspath(job["path"]))
+    os.chdir(job["cwd"])
+    sys.argv = [job["path"]] + job["argv"]
+    sys.path[:] = [script_dir] + base_path
+    sys.stdout, sys.stderr = stdout, stderr
+    try:
+        runpy.run_path(job["path"], run_name="__main__")
+    except SystemExit as e:
+        if e.code is None:
+            returncode = 0
+        elif isinstance(e.code, int):
+            returncode = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            returncode = 1
+    except BaseException as e:
+        # Drop the worker and runpy frames so the traceback reads like `python script.py`
+        tb = e.__traceback__
+        while tb is not None and tb.tb_frame.f_code.co_filename != job["path"]:
+            tb = tb.tb_next
+        traceback.print_exception(type(e), e, tb or e.__traceback__)
+        returncode = 1
+    finally:
+        sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+        os.chdir(base_cwd)
+        os.environ.clear()
+        os.environ.update(base_environ)
+        # The script's own modules are dropped so an edited helper is imported again
+        for module_name in local_modules(script_dir):
+            del sys.modules[module_name]
+        importlib.invalidate_caches()
+
+    reply({
+        "returncode": returncode,
+        "stdout": stdout.getvalue(),
+        "stderr": stderr.getvalue(),
+        "rss": current_rss(),
+        "cpu_time": time.process_time() - cpu_start,
+    })
+'''
+
+
+class _Worker:
+    """
+    A single warm interpreter running WORKER_SOURCE.
+    """
+    def __init__(self, python, preload):
+        self.process = subprocess.Popen(
+            [python, "-c", WORKER_SOURCE, json.dumps(list(preload))],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            env=task_environment(),
+        )
+        self.tasks_run = 0
+        self.rss = None
+        self.ready = False
+        self.broken = False
+
+    def wait_ready(self):
+        line = self.process.stdout.readline()
+        if not line:
+            raise RuntimeError("Worker interpreter exited during startup.")
+        self.ready = True
+
+    def run(self, path, argv, usage=None):
+        request = {"path": path, "argv": argv, "cwd": os.getcwd()}
+        self.process.stdin.write(json.dumps(request) + "\n")
+        self.process.stdin.flush()
+
+        line = self.process.stdout.readline()
+        if not line:
+            self.broken = True
+            raise RuntimeError("Worker interpreter exited while running the script.")
+
+        result = json.loads(line)
+        self.tasks_run += 1
+        self.rss = result["rss"]
+        if usage is not None:
+            usage.update({"cpu_time": result["cpu_time"], "peak_rss": result["rss"]})
+        return result["returncode"], result["stdout"], result["stderr"]
+
+    def is_alive(self):
+        return not self.broken and self.process.poll() is None
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=5)
+        except Exception:
+            self.process.kill()
+
+
+class WorkerPool:
+    """
+    Pool of pre-warmed Python interpreters that run `file` tasks without paying
+    interpreter startup and module imports on every run.
+    """
+    def __init__(self, size=2, preload=("pandas", "numpy"), max_tasks_per_worker=100, max_memory_mb=None, python="python"):
+        if size < 1:
+            raise ValueError("WorkerPool size must be at least 1.")
+
+        self.size = size
+        self.preload = tuple(preload)
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.max_memory_mb = max_memory_mb
+        self.python = python
+        self.recycled = 0
+        self._idle = queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+        # Start every worker first so the preload imports happen in parallel
+        workers = [self._spawn() for _ in range(size)]
+        for worker in workers:
+            worker.wait_ready()
+            self._idle.put(worker)
+
+    def _spawn(self):
+        worker = _Worker(self.python, self.preload)
+        with self._lock:
+            self._workers.append(worker)
+        return worker
+
+    def _retire(self, worker):
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+        worker.close()
+        self.recycled += 1
+
+    def _needs_recycling(self, worker):
+        if not worker.is_alive():
+            return True
+        if self.max_tasks_per_worker and worker.tasks_run >= self.max_tasks_per_worker:
+            return True
+        if self.max_memory_mb and worker.rss and worker.rss > self.max_memory_mb * 1024 * 1024:
+            return True
+        return False
+
+    def run(self, path, argv, usage=None):
+        '''
+        Runs the script at `path` with `sys.argv[1:] = argv` in an idle worker and
+        returns (returncode, stdout, stderr). A `usage` dict is filled with the
+        script's CPU time and the worker's memory.
+        '''
+        if self._closed:
+            raise RuntimeError("WorkerPool has been closed.")
+
+        worker = self._idle.get()
+        try:
+            return worker.run(path, argv, usage)
+        except RuntimeError as e:
+            return -1, "", f"{e}\n"
+        finally:
+            if self._needs_recycling(worker):
+                self._retire(worker)
+                if not self._closed:
+                    worker = self._spawn()
+                    worker.wait_ready()
+            if not self._closed:
+                self._idle.put(worker)
+
+    def close(self):
+        self._closed = True
+        with self._lock:
+            workers = list(self._workers)
+            self._workers = []
+        for worker in workers:
+            worker.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return f"WorkerPool(size={self.size}, preload={list(self.preload)})"
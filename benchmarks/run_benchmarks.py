@@ -0,0 +1,298 @@
+"""
+Benchmarks for the overhead SmallShovelPy itself adds: pipeline execution per task
+type, parameter resolution, log capture, the client control socket, scheduler
+trigger lag and API uploads. Everything runs offline; the API talks to a local
+stub server.
+
+    python benchmarks/run_benchmarks.py --output results.json
+    python benchmarks/run_benchmarks.py --compare old.json --output new.json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import platform
+import tempfile
+import datetime
+import threading
+import contextlib
+import statistics
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+STARTING_DIR = os.getcwd()
+WORKDIR = tempfile.mkdtemp(prefix="smallshovel_bench_")
+# Client creates its log file in the working directory at import time
+os.chdir(WORKDIR)
+
+import SmallShovelPy  # noqa: E402
+from SmallShovelPy import Pipeline, Logger, API  # noqa: E402
+
+
+@contextlib.contextmanager
+def quiet():
+    '''
+    Sends stdout and stderr to /dev/null so printing does not dominate the measurements.
+    '''
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+        yield
+
+
+def timed(func, repeat):
+    '''
+    Runs `func` `repeat` times and returns the per-run timings in seconds.
+    '''
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def summary(timings, per=1):
+    return {
+        "median": statistics.median(timings) / per,
+        "min": min(timings) / per,
+        "max": max(timings) / per,
+        "runs": len(timings),
+    }
+
+
+def noop():
+    return None
+
+
+def bench_pipeline_overhead(tasks, repeat):
+    results = {}
+
+    script = os.path.join(WORKDIR, "noop_task.py")
+    with open(script, "w") as file:
+        file.write("print('ok')\n")
+
+    # Func tasks: the call itself is free, so everything measured is framework cost
+    pipeline = Pipeline("bench-func")
+    for _ in range(tasks):
+        pipeline.add_task(noop)
+    with quiet():
+        results["func_task_seconds"] = summary(timed(pipeline.execute, repeat), per=tasks)
+
+    # File and shell tasks: subtract the cost of starting the same process directly
+    pipeline = Pipeline("bench-file")
+    for _ in range(tasks):
+        pipeline.add_task(file=script)
+    with quiet():
+        total = summary(timed(pipeline.execute, repeat), per=tasks)
+    direct = summary(timed(lambda: subprocess.run(["python", script], capture_output=True), repeat * tasks))
+    results["file_task_seconds"] = total
+    results["file_task_overhead_seconds"] = total["median"] - direct["median"]
+
+    pipeline = Pipeline("bench-shell")
+    for _ in range(tasks):
+        pipeline.add_task(shell="sh", command="true")
+    with quiet():
+        total = summary(timed(pipeline.execute, repeat), per=tasks)
+    direct = summary(timed(lambda: subprocess.run(["sh", "-c", "true"], capture_output=True), repeat * tasks))
+    results["shell_task_seconds"] = total
+    results["shell_task_overhead_seconds"] = total["median"] - direct["median"]
+
+    return results
+
+
+def bench_param_resolution(params_per_task, repeat):
+    pipeline = Pipeline("bench-params")
+    pipeline.add_task(noop)
+    pipeline.add_task(noop)
+
+    outputs = [{"rows": list(range(10)), "meta": {"name": "orders"}}]
+    params = [{}, {
+        f"p{n}": ("outputs[0]['rows'][3]" if n % 3 == 0 else "outputs[0]['meta']['name']" if n % 3 == 1 else n)
+        for n in range(params_per_task)
+    }]
+
+    timings = timed(lambda: pipeline._resolve_params(1, params, outputs), repeat)
+    return {"resolve_seconds_per_param": summary(timings, per=params_per_task)}
+
+
+def bench_logging(lines, repeat):
+    logger = Logger(os.path.join(WORKDIR, "bench"), log_as_stdout=False, broadcast_logs=False)
+
+    @logger.capture_output
+    def chatty():
+        for n in range(lines):
+            print(f"progress line {n}")
+
+    with quiet():
+        timings = timed(chatty, repeat)
+
+    return {
+        "capture_output_lines_per_second": lines / statistics.median(timings),
+        "capture_output_seconds": summary(timings),
+    }
+
+
+def bench_client_socket(requests, scheduled_pipelines):
+    from SmallShovelPy import Client
+
+    results = {}
+    client = Client(client_name="bench")
+    pipeline = Pipeline("bench")
+    pipeline.add_task(noop)
+    client.add_pipeline(pipeline)
+
+    with quiet():
+        threading.Thread(target=client.run_service, daemon=True).start()
+        deadline = time.time() + 30
+        while time.time() < deadline:
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+                if probe.connect_ex(("127.0.0.1", client.port)) == 0 and client.port != 5000:
+                    break
+            time.sleep(0.05)
+
+        timings = timed(lambda: client.send_command("127.0.0.1", client.port, "show pipelines"), requests)
+    results["control_request_seconds"] = summary(timings)
+
+    # Scheduler: every pipeline is due at the same instant, lag is how late each starts
+    fired = []
+    start_at = datetime.datetime.now() + datetime.timedelta(seconds=2)
+    for n in range(scheduled_pipelines):
+        scheduled = Pipeline(f"scheduled-{n}")
+        scheduled.add_task(lambda: fired.append(time.time()))
+        client.add_pipeline(scheduled)
+        with quiet():
+            client.schedule_pipeline(scheduled.name, "interval", seconds=3600, start_date=start_at)
+
+    with quiet():
+        client.scheduler.start()
+        deadline = time.time() + 60
+        while len(fired) < scheduled_pipelines and time.time() < deadline:
+            time.sleep(0.05)
+        client.scheduler.shutdown(wait=False)
+
+    lags = [fire - start_at.timestamp() for fire in fired]
+    results["scheduler_trigger_lag_seconds"] = summary(lags) if lags else None
+    results["scheduler_pipelines"] = scheduled_pipelines
+    results["scheduler_fired"] = len(fired)
+    return results
+
+
+class StubAPIHandler(BaseHTTPRequestHandler):
+    """
+    Accepts the client-data endpoints used by API and answers like the backend.
+    """
+    protocol_version = "HTTP/1.1"  # Allow keep-alive like a real server
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        body = json.dumps({"status": "ok"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def bench_api(rows_list):
+    import pandas as pd
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubAPIHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api = API("bench-token", base_url=f"http://127.0.0.1:{server.server_address[1]}")
+
+    results = {}
+    for rows in rows_list:
+        df = pd.DataFrame({
+            "id": range(rows),
+            "name": [f"customer {n}" for n in range(rows)],
+            "amount": [n * 0.5 for n in range(rows)],
+        })
+        with quiet():
+            start = time.perf_counter()
+            api.send_table(df, "bench", "table")
+            elapsed = time.perf_counter() - start
+        results[f"send_table_{rows}_rows"] = {"seconds": elapsed, "rows_per_second": rows / elapsed}
+
+    stats = api.stats()
+    results["api_requests"] = stats["requests"]
+    results["api_connections"] = stats["connections"]
+    results["api_median_latency_seconds"] = stats["median_latency"]
+    api.close()
+    server.shutdown()
+    return results
+
+
+def compare(old, new):
+    '''
+    Prints the relative change of every median/seconds number between two result files.
+    '''
+    def flatten(data, prefix=""):
+        for key, value in data.items():
+            if isinstance(value, dict):
+                yield from flatten(value, f"{prefix}{key}.")
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                yield f"{prefix}{key}", value
+
+    old_values = dict(flatten(old["results"]))
+    for name, value in flatten(new["results"]):
+        if name in old_values and old_values[name]:
+            change = (value - old_values[name]) / old_values[name] * 100
+            print(f"{name:70} {old_values[name]:>14.6g} -> {value:<14.6g} {change:+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SmallShovelPy overhead benchmarks")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--tasks", type=int, default=20)
+    parser.add_argument("--log-lines", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--scheduled-pipelines", type=int, default=50)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 60_000])
+    parser.add_argument("--skip", nargs="*", default=[], choices=["pipeline", "params", "logging", "client", "api"])
+    args = parser.parse_args()
+
+    benchmarks = {
+        "pipeline": lambda: bench_pipeline_overhead(args.tasks, args.repeat),
+        "params": lambda: bench_param_resolution(200, args.repeat * 100),
+        "logging": lambda: bench_logging(args.log_lines, args.repeat),
+        "client": lambda: bench_client_socket(args.requests, args.scheduled_pipelines),
+        "api": lambda: bench_api(args.rows),
+    }
+
+    results = {}
+    for name, bench in benchmarks.items():
+        if name in args.skip:
+            continue
+        print(f"Running {name} benchmarks...", file=sys.stderr)
+        results[name] = bench()
+
+    report = {
+        "version": SmallShovelPy.__version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": datetime.datetime.now().isoformat(),
+        "results": results,
+    }
+
+    if args.output:
+        with open(os.path.join(STARTING_DIR, args.output), "w") as file:
+            json.dump(report, file, indent=4)
+    else:
+        print(json.dumps(report, indent=4))
+
+    if args.compare:
+        with open(os.path.join(STARTING_DIR, args.compare), "r") as file:
+            compare(json.load(file), report)
+
+
+if __name__ == "__main__":
+    main()